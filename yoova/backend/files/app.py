@@ -1,14 +1,303 @@
-import requests
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import Optional
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+from typing import Any, AsyncContextManager, AsyncGenerator, Awaitable, Callable, Dict, List, Literal, Optional, Tuple
+from pathlib import Path
+import asyncio
+import hashlib
+import json
 import os
+import sys
+import time
 from fastapi.middleware.cors import CORSMiddleware
 
 from dotenv import load_dotenv
 load_dotenv()
 
-app = FastAPI()
+# Make the backend packages (models, services, utils, ...) importable when run from files/.
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.ai_model import GeminiClient
+from models.db_model import DEFAULT_DATABASE_PATH, Database, JobStore, ResponseCacheStore
+from routes.content_routes import GENERATORS, GenerationRequest
+from services.admission_service import AdmissionController
+from services.cache_service import ResponseCache, Revalidator, TieredCache
+from services.context_cache_service import ContextCache
+from services.degradation_service import DEGRADATION_LEVELS, DegradationController
+from services.disconnect_service import DisconnectCanceller, DisconnectCounter
+from services.hedge_service import Hedger
+from services.idempotency_service import IdempotencyConflict, IdempotencyStore
+from services.job_service import FINISHED_STATUSES, JobQueue
+from services.key_pool_service import KeyPool
+from services.limiter_service import RateLimiter
+from services.metrics_service import LatencyTracker
+from services.pipeline_service import Generation, GeneratorSpec, Pipeline, stream_within
+from services.resilience_service import CircuitBreaker, Resilience
+from services.router_service import ModelRouter
+from services.scheduler_service import PRIORITY_CLASSES, PriorityScheduler, lowest_priority
+from routes.user_routes import router as user_router, user_id_for
+from utils.helpers import (Deadline, current_deadline, current_degradations, current_endpoint, current_job, current_overrides,
+                           current_priority, current_user, stable_key)
+
+# --- API Configuration ---
+API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent"
+API_KEY = os.getenv("GOOGLE_GEMINI_API_KEY")
+# Optional pool of Gemini API keys (comma-separated) to spread quota over; defaults to the single key above.
+API_KEYS = [key.strip() for key in os.getenv("GOOGLE_GEMINI_API_KEYS", API_KEY or "").split(",") if key.strip()]
+# Seconds a key sits out after a 429 without a retry hint, and after a 403 (revoked or misconfigured key).
+GEMINI_KEY_COOLDOWN = float(os.getenv("GEMINI_KEY_COOLDOWN", "60"))
+GEMINI_KEY_FORBIDDEN_COOLDOWN = float(os.getenv("GEMINI_KEY_FORBIDDEN_COOLDOWN", "600"))
+# Size of the keep-alive pool to Gemini; match it to the generations one worker keeps in flight.
+GEMINI_POOL_SIZE = int(os.getenv("GEMINI_POOL_SIZE", "200"))
+
+# Response cache: a small per-process front tier over a table in database.db shared by all workers.
+# Byte budget of the front tier, per-endpoint TTLs in seconds (declared with each generator in GENERATORS,
+# routes/content_routes.py); trend-driven outputs expire sooner.
+DATABASE_PATH = os.getenv("DATABASE_PATH", DEFAULT_DATABASE_PATH)
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+RESPONSE_CACHE_FRONT_TTL = int(os.getenv("RESPONSE_CACHE_FRONT_TTL", "300"))
+RESPONSE_CACHE_VACUUM_INTERVAL = int(os.getenv("RESPONSE_CACHE_VACUUM_INTERVAL", "300"))
+CACHE_DEFAULT_TTL = int(os.getenv("CACHE_DEFAULT_TTL", "3600"))
+CACHE_TTLS = {generator.route: generator.cache_ttl for generator in GENERATORS if generator.cache_ttl is not None}
+
+# Stale-while-revalidate for trend-driven results: for SWR_GRACE seconds past their TTL they are still
+# served instantly while a single background refresh per key regenerates them.
+SWR_GRACE = int(os.getenv("SWR_GRACE", str(6 * 3600)))
+STALE_WHILE_REVALIDATE = {generator.route: SWR_GRACE for generator in GENERATORS if generator.revalidate}
+
+# End-to-end latency budget per endpoint in seconds, declared in GENERATORS; queue waits, retries and upstream
+# timeouts all fit in it; a stream has to start within it. Clients may ask for less with an X-Request-Timeout header.
+DEFAULT_LATENCY_BUDGET = float(os.getenv("DEFAULT_LATENCY_BUDGET", "60"))
+LATENCY_BUDGETS = {path: generator.budget for generator in GENERATORS if generator.budget is not None for path in generator.paths}
+
+# Batch fan-out: default and maximum upstream calls in flight per batch, and jobs per batch.
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "32"))
+BATCH_MAX_JOBS = int(os.getenv("BATCH_MAX_JOBS", "500"))
+
+# Priority classes for Gemini generation slots. Each path declares its default class (generators in GENERATORS); callers
+# may ask for a lower one with an X-Priority header but never a higher one.
+GEMINI_CONCURRENCY = int(os.getenv("GEMINI_CONCURRENCY", "64"))  # Generations in flight at once.
+PRIORITY_STARVATION_AFTER = float(os.getenv("PRIORITY_STARVATION_AFTER", "10"))  # Seconds before any waiter jumps the line.
+# Share of throughput per API user (see /users/me for ids) within a class, as JSON; unlisted users weigh 1.
+USER_WEIGHTS = {user: float(weight) for user, weight in json.loads(os.getenv("USER_WEIGHTS", "{}")).items()}
+DEFAULT_PRIORITY = "standard"
+ENDPOINT_PRIORITIES = {
+    **{path: generator.priority for generator in GENERATORS for path in generator.paths},
+    "/jobs": "standard",
+    "/batch": "bulk",
+}
+
+# Admission control: new generations are refused with 503 when their estimated wait for a slot, or the
+# number already waiting, is over these limits. Both can be changed at runtime through /admin/admission.
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "20"))
+ADMISSION_MAX_QUEUED = int(os.getenv("ADMISSION_MAX_QUEUED", "1000"))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")  # Required in X-Admin-Token by /admin endpoints; unset disables them.
+
+# Degradation: when Gemini errors, slows down or throttles us, step down to stale cached results,
+# then shorter long-form output, then a faster model for cheap endpoints; step back up on recovery.
+DEGRADED_STALE_FOR = int(os.getenv("DEGRADED_STALE_FOR", str(24 * 3600)))  # How long past expiry a result may be served.
+DEGRADED_CACHE_TTL = int(os.getenv("DEGRADED_CACHE_TTL", "60"))  # Cache lifetime of results generated while degraded.
+DEGRADED_MAX_OUTPUT_TOKENS = int(os.getenv("DEGRADED_MAX_OUTPUT_TOKENS", "1024"))
+GEMINI_FAST_MODEL = os.getenv("GEMINI_FAST_MODEL", "gemini-1.5-flash-8b")
+DEGRADE_ERROR_RATE = float(os.getenv("DEGRADE_ERROR_RATE", "0.2"))
+DEGRADE_P95_LATENCY = float(os.getenv("DEGRADE_P95_LATENCY", "20"))
+DEGRADE_RECOVERY_PERIOD = float(os.getenv("DEGRADE_RECOVERY_PERIOD", "30"))
+DEGRADED_LONG_FORM = tuple(path for generator in GENERATORS if generator.length == "long" for path in generator.paths)
+DEGRADED_CHEAP = tuple(path for generator in GENERATORS if generator.length == "short" for path in generator.paths)
+
+# Model routing: each endpoint's preferred model, then its fallbacks. A model is a Gemini model name or "backend/model"
+# on one of MODEL_BACKENDS (name -> base URL of any server speaking generateContent, e.g. a local stand-in). The router
+# leaves a model whose recent error rate or p95 latency (as a fraction of the endpoint's budget) is too high, or whose
+# MODEL_OUTPUT_LIMITS entry is below what a long-form endpoint needs. MODEL_ROUTES (JSON) replaces individual routes.
+MODEL_BACKENDS = {"gemini": API_URL.split("/models/")[0], **json.loads(os.getenv("MODEL_BACKENDS", "{}"))}
+DEFAULT_MODEL_ROUTE = ["gemini-1.5-flash", "gemini-1.5-flash-8b"]
+MODEL_ROUTES = {
+    **{path: ["gemini-1.5-flash", "gemini-1.5-pro"] for generator in GENERATORS if generator.length == "long" for path in generator.paths},
+    **json.loads(os.getenv("MODEL_ROUTES", "{}")),
+}
+MODEL_OUTPUT_LIMITS = {model: int(limit) for model, limit in json.loads(os.getenv("MODEL_OUTPUT_LIMITS", "{}")).items()}
+LONG_FORM_OUTPUT_TOKENS = int(os.getenv("LONG_FORM_OUTPUT_TOKENS", "4096"))
+ROUTER_LATENCY_TARGET = float(os.getenv("ROUTER_LATENCY_TARGET", "0.5"))
+ROUTER_MAX_ERROR_RATE = float(os.getenv("ROUTER_MAX_ERROR_RATE", "0.2"))
+ROUTER_WINDOW = float(os.getenv("ROUTER_WINDOW", "300"))  # Seconds of history each choice is based on.
+
+# Context caching: a system instruction (persona prefix plus the optional brand guide at BRAND_GUIDE_PATH) estimated
+# at CONTEXT_CACHE_MIN_TOKENS or more is registered through Gemini's cachedContents API and referenced by handle.
+# Handles live CONTEXT_CACHE_TTL seconds and are extended once less than CONTEXT_CACHE_REFRESH_BEFORE remain.
+CONTEXT_CACHE_ENABLED = os.getenv("CONTEXT_CACHE_ENABLED", "true").lower() == "true"
+CONTEXT_CACHE_MIN_TOKENS = int(os.getenv("CONTEXT_CACHE_MIN_TOKENS", "4096"))
+CONTEXT_CACHE_TTL = int(os.getenv("CONTEXT_CACHE_TTL", "3600"))
+CONTEXT_CACHE_REFRESH_BEFORE = int(os.getenv("CONTEXT_CACHE_REFRESH_BEFORE", "300"))
+BRAND_GUIDE_PATH = os.getenv("BRAND_GUIDE_PATH")
+
+# Idempotency-Key: retries of a generation or job submission with the same key get the original
+# response instead of a new generation, for IDEMPOTENCY_TTL seconds, from a store of bounded size.
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", "3600"))
+IDEMPOTENCY_MAX_BYTES = int(os.getenv("IDEMPOTENCY_MAX_BYTES", str(16 * 1024 * 1024)))
+
+# Background jobs: generations that run detached from the request, persisted in database.db.
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_RETENTION = int(os.getenv("JOB_RETENTION", str(24 * 3600)))  # Seconds a finished job stays retrievable.
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))  # How often progress streams re-read the job.
+
+# Gemini quota of each API key (requests and tokens per minute), shared by all generators, and how long /
+# how many requests may queue for the pool's combined quota before we answer 503 instead.
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", "1000"))
+GEMINI_TPM = int(os.getenv("GEMINI_TPM", "1000000"))
+GEMINI_QUEUE_MAX = int(os.getenv("GEMINI_QUEUE_MAX", "500"))
+GEMINI_QUEUE_MAX_WAIT = float(os.getenv("GEMINI_QUEUE_MAX_WAIT", "30"))
+
+# Upstream resilience: per-attempt timeout, retries with jittered backoff for transient failures, and the
+# circuit breaker that fails fast after consecutive failures until the upstream recovers.
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "60"))
+GEMINI_RETRY_ATTEMPTS = int(os.getenv("GEMINI_RETRY_ATTEMPTS", "3"))
+GEMINI_RETRY_BASE_DELAY = float(os.getenv("GEMINI_RETRY_BASE_DELAY", "0.5"))
+GEMINI_RETRY_MAX_DELAY = float(os.getenv("GEMINI_RETRY_MAX_DELAY", "8"))
+GEMINI_BREAKER_THRESHOLD = int(os.getenv("GEMINI_BREAKER_THRESHOLD", "5"))
+GEMINI_BREAKER_RESET = float(os.getenv("GEMINI_BREAKER_RESET", "30"))
+
+# Optional hedging: after the endpoint's GEMINI_HEDGE_PERCENTILE latency, send one duplicate request and keep
+# whichever answers first, for at most GEMINI_HEDGE_BUDGET (a fraction) of calls.
+GEMINI_HEDGE_ENABLED = os.getenv("GEMINI_HEDGE_ENABLED", "false").lower() == "true"
+GEMINI_HEDGE_PERCENTILE = float(os.getenv("GEMINI_HEDGE_PERCENTILE", "95"))
+GEMINI_HEDGE_BUDGET = float(os.getenv("GEMINI_HEDGE_BUDGET", "0.05"))
+GEMINI_HEDGE_MIN_SAMPLES = int(os.getenv("GEMINI_HEDGE_MIN_SAMPLES", "20"))
+
+latency_tracker = LatencyTracker()
+hedger = Hedger(latency_tracker, percentile=GEMINI_HEDGE_PERCENTILE, budget=GEMINI_HEDGE_BUDGET,
+                min_samples=GEMINI_HEDGE_MIN_SAMPLES) if GEMINI_HEDGE_ENABLED else None
+key_pool = KeyPool(API_KEYS, GEMINI_RPM, GEMINI_TPM, cooldown=GEMINI_KEY_COOLDOWN,
+                   forbidden_cooldown=GEMINI_KEY_FORBIDDEN_COOLDOWN) if API_KEYS else None
+key_count = len(API_KEYS) or 1
+rate_limiter = RateLimiter(GEMINI_RPM * key_count, GEMINI_TPM * key_count, max_queue=GEMINI_QUEUE_MAX,
+                           max_wait=GEMINI_QUEUE_MAX_WAIT)
+resilience = Resilience(
+    CircuitBreaker(failure_threshold=GEMINI_BREAKER_THRESHOLD, reset_timeout=GEMINI_BREAKER_RESET),
+    attempts=GEMINI_RETRY_ATTEMPTS,
+    base_delay=GEMINI_RETRY_BASE_DELAY,
+    max_delay=GEMINI_RETRY_MAX_DELAY,
+)
+model_router = ModelRouter(
+    MODEL_BACKENDS, MODEL_ROUTES, DEFAULT_MODEL_ROUTE,
+    targets={endpoint: budget * ROUTER_LATENCY_TARGET for endpoint, budget in LATENCY_BUDGETS.items()},
+    default_target=DEFAULT_LATENCY_BUDGET * ROUTER_LATENCY_TARGET,
+    output_limits=MODEL_OUTPUT_LIMITS,
+    output_needs={path: LONG_FORM_OUTPUT_TOKENS for generator in GENERATORS if generator.length == "long" for path in generator.paths},
+    window=ROUTER_WINDOW, max_error_rate=ROUTER_MAX_ERROR_RATE,
+)
+context_cache = ContextCache(ttl=CONTEXT_CACHE_TTL, refresh_before=CONTEXT_CACHE_REFRESH_BEFORE,
+                             min_tokens=CONTEXT_CACHE_MIN_TOKENS) if CONTEXT_CACHE_ENABLED else None
+gemini = GeminiClient(API_URL, API_KEY, pool_size=GEMINI_POOL_SIZE, timeout=GEMINI_TIMEOUT,
+                      limiter=rate_limiter, resilience=resilience, latency=latency_tracker, hedger=hedger,
+                      keys=key_pool, router=model_router, context_cache=context_cache)
+database = Database(DATABASE_PATH)
+response_cache = TieredCache(
+    ResponseCache(max_bytes=RESPONSE_CACHE_MAX_BYTES),
+    ResponseCacheStore(database, vacuum_interval=RESPONSE_CACHE_VACUUM_INTERVAL,
+                       grace=max(DEGRADED_STALE_FOR, *STALE_WHILE_REVALIDATE.values())),
+    front_ttl=RESPONSE_CACHE_FRONT_TTL,
+)
+revalidator = Revalidator()
+idempotency = IdempotencyStore(ttl=IDEMPOTENCY_TTL, max_bytes=IDEMPOTENCY_MAX_BYTES)
+# A generation cannot outlive its latency budget, so a job still marked running well past
+# the longest budget lost its worker. run_job is defined with the batch generators below.
+scheduler = PriorityScheduler(slots=GEMINI_CONCURRENCY, starvation_after=PRIORITY_STARVATION_AFTER, weights=USER_WEIGHTS)
+admission = AdmissionController(scheduler, latency_tracker, max_wait=ADMISSION_MAX_WAIT, max_queued=ADMISSION_MAX_QUEUED)
+degradation = DegradationController(
+    resilience.breaker, rate_limiter,
+    long_form=DEGRADED_LONG_FORM, cheap=DEGRADED_CHEAP,
+    max_output_tokens=DEGRADED_MAX_OUTPUT_TOKENS, fast_model=GEMINI_FAST_MODEL,
+    error_threshold=DEGRADE_ERROR_RATE, latency_threshold=DEGRADE_P95_LATENCY, recovery_period=DEGRADE_RECOVERY_PERIOD,
+)
+job_queue = JobQueue(JobStore(database, retention=JOB_RETENTION), lambda job: run_job(job),
+                     workers=JOB_WORKERS, stale_after=2 * max(DEFAULT_LATENCY_BUDGET, *LATENCY_BUDGETS.values()))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Opens the shared upstream client and resumes background jobs at startup; stops both at shutdown."""
+    gemini.open()
+    await job_queue.start()
+    yield
+    await job_queue.stop()
+    await gemini.aclose()
+
+app = FastAPI(lifespan=lifespan)
+
+# --- Deadline Configuration ---
+@app.middleware("http")
+async def apply_client_deadline(request: Request, call_next):
+    """Turns an X-Request-Timeout header (seconds) into the request's deadline."""
+    header = request.headers.get("X-Request-Timeout")
+    if header is not None:
+        try:
+            budget = float(header)
+        except ValueError:
+            budget = 0.0
+        if not budget > 0:
+            return JSONResponse(status_code=400, content={"detail": "X-Request-Timeout must be a positive number of seconds."})
+        current_deadline.set(Deadline(budget))
+    return await call_next(request)
+
+# --- User Configuration ---
+@app.middleware("http")
+async def identify_user(request: Request, call_next):
+    """Records which API user the request is made on behalf of, for fair scheduling."""
+    current_user.set(user_id_for(request))
+    return await call_next(request)
+
+app.include_router(user_router)
+
+# --- Priority Configuration ---
+@app.middleware("http")
+async def apply_priority(request: Request, call_next):
+    """Sets the request's priority class: the path's default, or a lower class from X-Priority."""
+    default = ENDPOINT_PRIORITIES.get(request.url.path, DEFAULT_PRIORITY)
+    requested = request.headers.get("X-Priority", default)
+    if requested not in PRIORITY_CLASSES:
+        return JSONResponse(status_code=400, content={"detail": f"X-Priority must be one of {', '.join(PRIORITY_CLASSES)}."})
+    current_priority.set(lowest_priority(default, requested))
+    return await call_next(request)
+
+# --- Degradation Configuration ---
+@app.middleware("http")
+async def report_degradation(request: Request, call_next):
+    """Adds an X-Degraded header listing how the response was degraded, if it was."""
+    marks = set()
+    current_degradations.set(marks)
+    response = await call_next(request)
+    if marks:
+        response.headers["X-Degraded"] = ",".join(sorted(marks))
+    return response
+
+# --- Idempotency Configuration ---
+IDEMPOTENT_PATHS = {generator.route for generator in GENERATORS} | {"/jobs"}
+
+@app.middleware("http")
+async def apply_idempotency_key(request: Request, call_next):
+    """Runs a POST carrying an Idempotency-Key at most once per user, replaying the response to retries."""
+    idempotency_key = request.headers.get("Idempotency-Key")
+    if idempotency_key is None or request.method != "POST" or request.url.path not in IDEMPOTENT_PATHS:
+        return await call_next(request)
+    # Keys are opaque client values, so unlike cache keys they are hashed as sent: "K" and "k" differ.
+    key = hashlib.sha256(json.dumps([user_id_for(request), request.url.path, idempotency_key]).encode()).hexdigest()
+    fingerprint = hashlib.sha256(await request.body()).hexdigest()
+
+    async def execute():
+        response = await call_next(request)
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        headers = {name: value for name, value in response.headers.items() if name != "content-length"}
+        return {"status": response.status_code, "headers": headers, "body": body.decode()}
+
+    try:
+        stored, replayed = await idempotency.run(key, fingerprint, execute)
+    except IdempotencyConflict:
+        return JSONResponse(status_code=422, content={"detail": "Idempotency-Key was already used with a different request."})
+    response = Response(content=stored["body"], status_code=stored["status"], headers=stored["headers"])
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return response
 
 # --- CORS Configuration ---
 origins = [
@@ -25,750 +314,536 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
-# --- YouTube Related Models and Functions ---
-class ScriptRequest(BaseModel):
-    topic: str
-    style: Optional[str] = "informative"
-
-class ScriptResponse(BaseModel):
-    script: str
-
-class ChannelNameRequest(BaseModel):
-    topic: str
-    keywords: Optional[str] = None
-
-class ChannelNameResponse(BaseModel):
-    channel_name: str
-
-class NicheSuggestionRequest(BaseModel):
-    interests: str
-
-class NicheSuggestionResponse(BaseModel):
-    niche_suggestions: str
-
-class VideoIdeaRequest(BaseModel):
-    topic: str
-    keywords: Optional[str] = None
-
-class VideoIdeaResponse(BaseModel):
-    video_ideas: str
-
-class PostContentRequest(BaseModel):
-    topic: str
-    keywords: Optional[str] = None
-    style: Optional[str] = "engaging"
-
-class PostContentResponse(BaseModel):
-    post_content: str
-    
-# --- X (Twitter) Related Models and Functions ---
-class TweetRequest(BaseModel):
-    topic: str
-    keywords: Optional[str] = None
-    style: Optional[str] = "engaging"
-
-class TweetResponse(BaseModel):
-    tweet: str
-
-# --- Instagram Related Models and Functions ---
-class InstagramPostRequest(BaseModel):
-    topic: str
-    keywords: Optional[str] = None
-    style: Optional[str] = "engaging"
-
-class InstagramPostResponse(BaseModel):
-    post_content: str
-
-class InstagramStoryRequest(BaseModel):
-    topic: str
-    keywords: Optional[str] = None
-    style: Optional[str] = "engaging"
-
-class InstagramStoryResponse(BaseModel):
-    story_content: str
-
-class InstagramChannelNameRequest(BaseModel):
-    topic: str
-    keywords: Optional[str] = None
-
-class InstagramChannelNameResponse(BaseModel):
-    channel_name: str
-
-class InstagramVideoIdeaRequest(BaseModel):
-    topic: str
-    keywords: Optional[str] = None
-
-class InstagramVideoIdeaResponse(BaseModel):
-    video_ideas: str
-
-class InstagramNicheSuggestionRequest(BaseModel):
-    interests: str
-
-class InstagramNicheSuggestionResponse(BaseModel):
-    niche_suggestions: str
-
-class InstagramReelIdeaRequest(BaseModel):
-    topic: str
-    keywords: Optional[str] = None
-
-class InstagramReelIdeaResponse(BaseModel):
-    reel_ideas: str
-
-class InstagramVideoScriptRequest(BaseModel):
-    topic: str
-    style: Optional[str] = "informative"
-
-class InstagramVideoScriptResponse(BaseModel):
-    script: str
-
-# --- Email Related Models and Functions ---
-class EmailRequest(BaseModel):
-    topic: str
-    style: Optional[str] = "professional"
-    keywords: Optional[str] = None
-
-class EmailResponse(BaseModel):
-    email_content: str
-
-# --- API Configuration ---
-API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent"
-API_KEY = os.getenv("GOOGLE_GEMINI_API_KEY")
+# --- Disconnect Configuration ---
+# Outermost, so a client that goes away cancels everything its request started.
+disconnects = DisconnectCounter()
+app.add_middleware(
+    DisconnectCanceller,
+    paths={path for generator in GENERATORS for path in generator.paths} | {"/batch"},
+    counter=disconnects,
+)
 
-# --- YouTube Related Functions ---
-def generate_script(topic: str, style: str) -> str:
-    """Generates a script using the Google Gemini API."""
-    payload = {
-       "contents": [
-        {
-          "parts": [
-             {
-              "text": f"""
-              You are an expert script writer who creates high quality video scripts.
-               
-              Generate a video script about '{topic}' in a '{style}' style. 
-              """
-              }
-           ]
-         }
-       ]
-    }
-    headers = {
-        "Content-Type": "application/json",
-        "x-goog-api-key": f"{API_KEY}"
-    }
-    response = requests.post(API_URL, json=payload, headers=headers)
-    if response.status_code == 200:
-        try:
-          result = response.json()
-          script = result["candidates"][0]["content"]["parts"][0]["text"]
-          return script
-        except (KeyError,IndexError):
-          raise HTTPException(status_code=500, detail="Error processing the response from Gemini API")
-    else:
-        raise HTTPException(status_code=response.status_code, detail=f"Error generating script with Gemini API: {response.text}")
-
-def suggest_channel_name(topic: str, keywords: Optional[str] = None) -> str:
-    """Suggests a unique channel name using the Google Gemini API."""
-    prompt = f"Suggest a unique and catchy YouTube channel name about '{topic}'."
-    if keywords:
-        prompt += f" Include these keywords: {keywords}."
-    payload = {
-        "contents": [
-            {
-                "parts": [
-                    {
-                        "text": prompt
-                    }
-                ]
-            }
-        ]
-    }
-    headers = {
-        "Content-Type": "application/json",
-        "x-goog-api-key": f"{API_KEY}"
-    }
-    response = requests.post(API_URL, json=payload, headers=headers)
-    if response.status_code == 200:
-        try:
-           result = response.json()
-           channel_name = result["candidates"][0]["content"]["parts"][0]["text"]
-           return channel_name
-        except (KeyError, IndexError):
-            raise HTTPException(status_code=500, detail="Error processing response from Gemini API")
-    else:
-        raise HTTPException(status_code=response.status_code, detail=f"Error generating channel name with Gemini API: {response.text}")
-
-def suggest_niche(interests: str) -> str:
-    """Suggests a niche for a YouTube channel based on provided interests."""
-    prompt = f"""
-    You are an expert in identifying profitable and trending niches.
-    
-    Based on the following interests: {interests}, suggest several specific YouTube channel niches
-    that could be successful, along with reasons why.
+# --- Admin Related Models ---
+class AdmissionSettings(BaseModel):
+    max_wait_seconds: Optional[float] = Field(None, gt=0)
+    max_queued: Optional[int] = Field(None, ge=1)
+
+# --- Batch Related Models ---
+class BatchJob(BaseModel):
+    generator: str  # One of BATCH_GENERATORS, e.g. "script", "tweet", "instagram_post", "email".
+    params: Dict[str, Any] = {}
+    id: Optional[str] = None  # Echoed back so clients can match results to jobs.
+
+class BatchRequest(BaseModel):
+    jobs: List[BatchJob]
+    concurrency: Optional[int] = None  # Lower than the server default to be gentler; capped at BATCH_MAX_CONCURRENCY.
+
+# --- Job Related Models ---
+class JobRequest(BaseModel):
+    generator: str  # One of BATCH_GENERATORS, e.g. "script" or "instagram_video_script".
+    params: Dict[str, Any] = {}
+
+class JobResponse(BaseModel):
+    id: str
+    generator: str
+    params: Dict[str, Any]
+    priority: str
+    status: Literal["queued", "running", "succeeded", "failed"]
+    status_code: Optional[int] = None  # HTTP status the generation would have returned.
+    result: Optional[Any] = None
+    error: Optional[Any] = None
+    created_at: float
+    updated_at: float
+
+# --- Prompt Prefixes ---
+# The static part of each persona prompt. It goes out as the system instruction, ahead of the request-specific
+# prompt, so Gemini can cache it once it grows long (see CONTEXT_CACHE_MIN_TOKENS).
+BRAND_GUIDE = Path(BRAND_GUIDE_PATH).read_text(encoding="utf-8").strip() if BRAND_GUIDE_PATH else ""
+PROMPT_PREFIXES = {
+    "script_writer": "You are an expert script writer who creates high quality video scripts.",
+    "instagram_script_writer": "You are an expert script writer who creates high quality video scripts for Instagram.",
+    "niche_expert": "You are an expert in identifying profitable and trending niches.",
+    "content_creator": "You are an expert content creator who adapts one idea to every platform.",
+}
+
+def system_instruction(prefix: str) -> dict:
+    """systemInstruction for a payload: the named prefix, followed by the brand guide if one is configured."""
+    text = PROMPT_PREFIXES[prefix] + (f"\n\n{BRAND_GUIDE}" if BRAND_GUIDE else "")
+    return {"parts": [{"text": text}]}
+
+# --- Shared Generation Helpers ---
+async def generate_candidates(payload: dict, what: str, count: int) -> List[str]:
+    """Returns up to `count` distinct options from a single upstream call.
+
+    Several options are requested as a JSON array through structured output rather than
+    separate calls, so the upstream request volume does not grow with `count`.
     """
-    payload = {
-      "contents": [
-        {
-          "parts": [
-             {
-                "text": prompt
-             }
-          ]
-         }
-       ]
-    }
-    headers = {
-        "Content-Type": "application/json",
-        "x-goog-api-key": f"{API_KEY}"
-    }
-    response = requests.post(API_URL, json=payload, headers=headers)
-    if response.status_code == 200:
-        try:
-          result = response.json()
-          niche_suggestions = result["candidates"][0]["content"]["parts"][0]["text"]
-          return niche_suggestions
-        except (KeyError, IndexError):
-           raise HTTPException(status_code=500, detail="Error processing response from Gemini API")
-    else:
-        raise HTTPException(status_code=response.status_code, detail=f"Error generating niche suggestions with Gemini API: {response.text}")
-
-def generate_video_ideas(topic: str, keywords: Optional[str] = None) -> str:
-    """Generates video ideas using the Google Gemini API."""
-    prompt = f"Suggest several creative and engaging video ideas about '{topic}'."
-    if keywords:
-        prompt += f" Consider these keywords: {keywords}."
-    payload = {
-        "contents": [
-            {
-                "parts": [
-                    {
-                        "text": prompt
-                    }
-                ]
-            }
-        ]
-    }
-    headers = {
-        "Content-Type": "application/json",
-        "x-goog-api-key": f"{API_KEY}"
-    }
-    response = requests.post(API_URL, json=payload, headers=headers)
-    if response.status_code == 200:
-       try:
-          result = response.json()
-          video_ideas = result["candidates"][0]["content"]["parts"][0]["text"]
-          return video_ideas
-       except (KeyError, IndexError):
-            raise HTTPException(status_code=500, detail="Error processing response from Gemini API")
-    else:
-        raise HTTPException(status_code=response.status_code, detail=f"Error generating video ideas with Gemini API: {response.text}")
-
-def generate_post_content(topic: str, keywords: Optional[str] = None, style: Optional[str] = "engaging") -> str:
-    """Generates a YouTube post (text-based) using the Google Gemini API."""
-    prompt = f"Generate a YouTube text post about '{topic}' in a '{style}' style."
-    if keywords:
-        prompt += f" Include these keywords: {keywords}."
-    payload = {
-        "contents": [
-            {
-                "parts": [
-                    {
-                        "text": prompt
-                    }
-                ]
-            }
-        ]
-    }
-    headers = {
-        "Content-Type": "application/json",
-        "x-goog-api-key": f"{API_KEY}"
-    }
-    response = requests.post(API_URL, json=payload, headers=headers)
-    if response.status_code == 200:
-      try:
-        result = response.json()
-        post_content = result["candidates"][0]["content"]["parts"][0]["text"]
-        return post_content
-      except (KeyError, IndexError):
-          raise HTTPException(status_code=500, detail="Error processing response from Gemini API")
-    else:
-        raise HTTPException(status_code=response.status_code, detail=f"Error generating post content with Gemini API: {response.text}")
-
-# --- X (Twitter) Related Functions ---
-def generate_tweet(topic: str, keywords: Optional[str] = None, style: Optional[str] = "engaging") -> str:
-    """Generates a tweet (text-based) using the Google Gemini API."""
-    prompt = f"Generate a concise tweet about '{topic}' in a '{style}' style. Keep it under 280 characters."
-    if keywords:
-        prompt += f" Include these keywords: {keywords}."
-    payload = {
-        "contents": [
-            {
-                "parts": [
-                    {
-                        "text": prompt
-                    }
-                ]
-            }
-        ]
-    }
-    headers = {
-        "Content-Type": "application/json",
-        "x-goog-api-key": f"{API_KEY}"
-    }
-    response = requests.post(API_URL, json=payload, headers=headers)
-    if response.status_code == 200:
-      try:
-        result = response.json()
-        tweet = result["candidates"][0]["content"]["parts"][0]["text"]
-        return tweet
-      except (KeyError, IndexError):
-          raise HTTPException(status_code=500, detail="Error processing response from Gemini API")
-    else:
-        raise HTTPException(status_code=response.status_code, detail=f"Error generating tweet with Gemini API: {response.text}")
-
-# --- Instagram Related Functions ---
-def generate_instagram_post(topic: str, keywords: Optional[str] = None, style: Optional[str] = "engaging") -> str:
-    """Generates content for an Instagram post using the Google Gemini API."""
-    prompt = f"Generate engaging content for an Instagram post about '{topic}' in a '{style}' style. Include relevant hashtags."
-    if keywords:
-        prompt += f" Consider these keywords: {keywords}."
-    payload = {
-        "contents": [
-            {
-                "parts": [
-                    {
-                        "text": prompt
-                    }
-                ]
-            }
-        ]
-    }
-    headers = {
-        "Content-Type": "application/json",
-        "x-goog-api-key": f"{API_KEY}"
-    }
-    response = requests.post(API_URL, json=payload, headers=headers)
-    if response.status_code == 200:
-        try:
-            result = response.json()
-            post_content = result["candidates"][0]["content"]["parts"][0]["text"]
-            return post_content
-        except (KeyError, IndexError):
-            raise HTTPException(status_code=500, detail="Error processing response from Gemini API")
-    else:
-        raise HTTPException(status_code=response.status_code, detail=f"Error generating Instagram post content with Gemini API: {response.text}")
-
-def generate_instagram_story(topic: str, keywords: Optional[str] = None, style: Optional[str] = "engaging") -> str:
-    """Generates content for an Instagram story using the Google Gemini API."""
-    prompt = f"Generate engaging content for an Instagram story about '{topic}' in a '{style}' style. The content should be concise and attention-grabbing."
-    if keywords:
-        prompt += f" Consider these keywords: {keywords}."
-    payload = {
-        "contents": [
-            {
-                "parts": [
-                    {
-                        "text": prompt
-                    }
-                ]
-            }
-        ]
-    }
-    headers = {
-        "Content-Type": "application/json",
-        "x-goog-api-key": f"{API_KEY}"
-    }
-    response = requests.post(API_URL, json=payload, headers=headers)
-    if response.status_code == 200:
-        try:
-            result = response.json()
-            story_content = result["candidates"][0]["content"]["parts"][0]["text"]
-            return story_content
-        except (KeyError, IndexError):
-            raise HTTPException(status_code=500, detail="Error processing response from Gemini API")
-    else:
-        raise HTTPException(status_code=response.status_code, detail=f"Error generating Instagram story content with Gemini API: {response.text}")
-
-
-def suggest_instagram_channel_name(topic: str, keywords: Optional[str] = None) -> str:
-    """Suggests a unique Instagram channel name using the Google Gemini API."""
-    prompt = f"Suggest a unique and catchy Instagram channel name about '{topic}'."
-    if keywords:
-        prompt += f" Include these keywords: {keywords}."
-    payload = {
-        "contents": [
-            {
-                "parts": [
-                    {
-                        "text": prompt
-                    }
-                ]
-            }
-        ]
-    }
-    headers = {
-        "Content-Type": "application/json",
-        "x-goog-api-key": f"{API_KEY}"
-    }
-    response = requests.post(API_URL, json=payload, headers=headers)
-    if response.status_code == 200:
-        try:
-           result = response.json()
-           channel_name = result["candidates"][0]["content"]["parts"][0]["text"]
-           return channel_name
-        except (KeyError, IndexError):
-            raise HTTPException(status_code=500, detail="Error processing response from Gemini API")
-    else:
-        raise HTTPException(status_code=response.status_code, detail=f"Error generating Instagram channel name with Gemini API: {response.text}")
-        
-def generate_instagram_video_ideas(topic: str, keywords: Optional[str] = None) -> str:
-    """Generates video ideas for Instagram using the Google Gemini API."""
-    prompt = f"Suggest several creative and engaging video ideas for Instagram about '{topic}'."
-    if keywords:
-        prompt += f" Consider these keywords: {keywords}."
-    payload = {
-        "contents": [
-            {
-                "parts": [
-                    {
-                        "text": prompt
-                    }
-                ]
-            }
-        ]
-    }
-    headers = {
-        "Content-Type": "application/json",
-        "x-goog-api-key": f"{API_KEY}"
+    if count <= 1:
+        return [await gemini.agenerate_text(payload, what)]
+    payload["contents"][0]["parts"][0]["text"] += f" Return {count} distinct options as a JSON array of strings, one option per item."
+    payload["generationConfig"] = {
+        "responseMimeType": "application/json",
+        "responseSchema": {"type": "ARRAY", "items": {"type": "STRING"}},
     }
-    response = requests.post(API_URL, json=payload, headers=headers)
-    if response.status_code == 200:
-        try:
-            result = response.json()
-            video_ideas = result["candidates"][0]["content"]["parts"][0]["text"]
-            return video_ideas
-        except (KeyError, IndexError):
-            raise HTTPException(status_code=500, detail="Error processing response from Gemini API")
-    else:
-        raise HTTPException(status_code=response.status_code, detail=f"Error generating Instagram video ideas with Gemini API: {response.text}")
-
-def suggest_instagram_niche(interests: str) -> str:
-    """Suggests a niche for an Instagram channel based on provided interests."""
-    prompt = f"""
-        You are an expert in identifying profitable and trending niches.
-
-        Based on the following interests: {interests}, suggest several specific Instagram channel niches
-        that could be successful, along with reasons why.
+    options = await gemini.agenerate_json(payload, what)
+    if not isinstance(options, list):
+        raise HTTPException(status_code=500, detail="Error processing response from Gemini API")
+    distinct = list(dict.fromkeys(str(option).strip() for option in options if str(option).strip()))
+    if not distinct:
+        raise HTTPException(status_code=500, detail="Error processing response from Gemini API")
+    return distinct[:count]
+
+def build_payload(generation: Generation) -> dict:
+    """Builds the Gemini payload for a generation from its generator's prompt template."""
+    spec = generation.spec
+    payload = {"contents": [{"parts": [{"text": spec.render(generation.request)}]}]}
+    if spec.persona:
+        payload["systemInstruction"] = system_instruction(spec.persona)
+    if spec.schema:
+        payload["generationConfig"] = {"responseMimeType": "application/json", "responseSchema": spec.schema(generation.request)}
+    return payload
+
+async def call_gemini(generation: Generation) -> Any:
+    """The end of the generation pipeline: one upstream call, queued, retried and rate limited by the client.
+
+    Streams get the text chunks from the Google Gemini API as they are generated.
     """
-    payload = {
-        "contents": [
-            {
-                "parts": [
-                    {
-                        "text": prompt
-                    }
-                ]
-            }
-        ]
-    }
-    headers = {
-        "Content-Type": "application/json",
-        "x-goog-api-key": f"{API_KEY}"
-    }
-    response = requests.post(API_URL, json=payload, headers=headers)
-    if response.status_code == 200:
-        try:
-           result = response.json()
-           niche_suggestions = result["candidates"][0]["content"]["parts"][0]["text"]
-           return niche_suggestions
-        except (KeyError, IndexError):
-             raise HTTPException(status_code=500, detail="Error processing response from Gemini API")
-    else:
-        raise HTTPException(status_code=response.status_code, detail=f"Error generating Instagram niche suggestions with Gemini API: {response.text}")
-
-def generate_instagram_reel_ideas(topic: str, keywords: Optional[str] = None) -> str:
-    """Generates video reel ideas for Instagram using the Google Gemini API."""
-    prompt = f"Suggest several creative and engaging video reel ideas for Instagram about '{topic}'. Focus on short, attention-grabbing concepts."
-    if keywords:
-        prompt += f" Consider these keywords: {keywords}."
-    payload = {
-        "contents": [
-            {
-                "parts": [
-                    {
-                        "text": prompt
-                    }
-                ]
-            }
-        ]
-    }
-    headers = {
-        "Content-Type": "application/json",
-        "x-goog-api-key": f"{API_KEY}"
-    }
-    response = requests.post(API_URL, json=payload, headers=headers)
-    if response.status_code == 200:
-        try:
-            result = response.json()
-            reel_ideas = result["candidates"][0]["content"]["parts"][0]["text"]
-            return reel_ideas
-        except (KeyError, IndexError):
-            raise HTTPException(status_code=500, detail="Error processing response from Gemini API")
-    else:
-        raise HTTPException(status_code=response.status_code, detail=f"Error generating Instagram reel ideas with Gemini API: {response.text}")
-
-def generate_instagram_video_script(topic: str, style: str) -> str:
-    """Generates a script for Instagram videos using the Google Gemini API."""
-    payload = {
-       "contents": [
-        {
-          "parts": [
-             {
-              "text": f"""
-              You are an expert script writer who creates high quality video scripts for Instagram.
-               
-              Generate a video script about '{topic}' in a '{style}' style.
-              Make it concise and suitable for a short video.
-              """
-              }
-           ]
-         }
-       ]
-    }
-    headers = {
-        "Content-Type": "application/json",
-        "x-goog-api-key": f"{API_KEY}"
-    }
-    response = requests.post(API_URL, json=payload, headers=headers)
-    if response.status_code == 200:
-        try:
-          result = response.json()
-          script = result["candidates"][0]["content"]["parts"][0]["text"]
-          return script
-        except (KeyError,IndexError):
-          raise HTTPException(status_code=500, detail="Error processing the response from Gemini API")
-    else:
-        raise HTTPException(status_code=response.status_code, detail=f"Error generating Instagram video script with Gemini API: {response.text}")
-
-# --- Email Related Functions ---
-def generate_email(topic: str, style: str, keywords: Optional[str] = None) -> str:
-    """Generates email content using the Google Gemini API."""
-    prompt = f"Generate an email about '{topic}' in a '{style}' style."
-    if keywords:
-        prompt += f" Include these keywords: {keywords}."
-    payload = {
-        "contents": [
-            {
-                "parts": [
-                    {
-                        "text": prompt
-                    }
-                ]
-            }
-        ]
-    }
-    headers = {
-        "Content-Type": "application/json",
-        "x-goog-api-key": f"{API_KEY}"
-    }
-    response = requests.post(API_URL, json=payload, headers=headers)
-    if response.status_code == 200:
-        try:
-            result = response.json()
-            email_content = result["candidates"][0]["content"]["parts"][0]["text"]
-            return email_content
-        except (KeyError, IndexError):
-            raise HTTPException(status_code=500, detail="Error processing response from Gemini API")
-    else:
-        raise HTTPException(status_code=response.status_code, detail=f"Error generating email content with Gemini API: {response.text}")
-
-
-# --- API Endpoints ---
-# YouTube Endpoints
-@app.post("/youtube/generate-script", response_model=ScriptResponse)
-def generate_video_script(request: ScriptRequest):
-    """API endpoint to generate video scripts."""
-    if not request.topic:
-        raise HTTPException(status_code=400, detail="Topic is required.")
+    spec, request = generation.spec, generation.request
+    payload = build_payload(generation)
+    if generation.stream:
+        return gemini.astream_text(payload, spec.what)
+    if spec.candidates:
+        return await generate_candidates(payload, spec.what, request.count)
+    if spec.schema:
+        return spec.parse(request, await gemini.agenerate_json(payload, spec.what))
+    return await gemini.agenerate_text(payload, spec.what)
+
+# --- Batch Generators ---
+# name -> generator, for /batch and /jobs.
+BATCH_GENERATORS = {generator.name: generator for generator in GENERATORS}
+
+def parse_job(generator: str, params: Dict[str, Any]) -> Tuple[GeneratorSpec, GenerationRequest]:
+    """Resolves a named generator and validates its params into the endpoint's request model."""
+    spec = BATCH_GENERATORS.get(generator)
+    if spec is None:
+        raise HTTPException(status_code=400, detail=f"Unknown generator '{generator}'.")
     try:
-      script = generate_script(request.topic, request.style)
-    except HTTPException as e:
-      raise e
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
-    return ScriptResponse(script=script)
-
-@app.post("/youtube/suggest-channel-name", response_model=ChannelNameResponse)
-def suggest_youtube_channel_name(request: ChannelNameRequest):
-    """API endpoint to suggest a YouTube channel name."""
-    if not request.topic:
-      raise HTTPException(status_code=400, detail="Topic is required.")
+        request = spec.request_model(**params)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+    missing = spec.missing(request)
+    if missing:
+        raise HTTPException(status_code=400, detail=missing)
+    return spec, request
+
+async def run_generator(generator: str, params: Dict[str, Any]) -> dict:
+    """Runs one named generator, turning any failure into a status and error.
+
+    Must run in its own task, which gets its own record of how the result was degraded.
+    """
+    marks = set()
+    current_degradations.set(marks)
     try:
-      channel_name = suggest_channel_name(request.topic, request.keywords)
+        spec, request = parse_job(generator, params)
+        # The same body the generator's endpoint answers with.
+        result = spec.response(await generation_pipeline.run(Generation(spec, request))).model_dump()
     except HTTPException as e:
-      raise e
+        return {"status": e.status_code, "error": e.detail}
     except Exception as e:
-      raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
-    return ChannelNameResponse(channel_name=channel_name)
-
-@app.post("/youtube/suggest-niche", response_model=NicheSuggestionResponse)
-def suggest_youtube_niche(request: NicheSuggestionRequest):
-    """API endpoint to suggest a YouTube channel niche."""
-    if not request.interests:
-        raise HTTPException(status_code=400, detail="Interests are required.")
+        return {"status": 500, "error": f"An unexpected error occurred: {e}"}
+    if marks:
+        return {"status": 200, "result": result, "degraded": sorted(marks)}
+    return {"status": 200, "result": result}
+
+async def run_job(job: dict) -> dict:
+    """Runs a stored background job at the priority, and for the user, it was submitted with."""
+    current_priority.set(job["priority"])
+    current_user.set(job["user_id"])
+    current_job.set(job["id"])
+    return await run_generator(job["generator"], job["params"])
+
+async def run_batch_job(index: int, job: BatchJob, semaphore: asyncio.Semaphore) -> dict:
+    """Runs one batch job, turning any failure into a per-item error."""
+    item = {"index": index, "id": job.id, "generator": job.generator}
+    async with semaphore:
+        return {**item, **await run_generator(job.generator, job.params)}
+
+async def stream_batch(jobs: List[BatchJob], concurrency: int) -> AsyncGenerator[str, None]:
+    """Fans the jobs out with bounded concurrency and yields NDJSON lines as each completes."""
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = [asyncio.ensure_future(run_batch_job(index, job, semaphore)) for index, job in enumerate(jobs)]
     try:
-        niche_suggestions = suggest_niche(request.interests)
-    except HTTPException as e:
-        raise e
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
-    return NicheSuggestionResponse(niche_suggestions=niche_suggestions)
-
-@app.post("/youtube/generate-video-ideas", response_model=VideoIdeaResponse)
-def generate_youtube_video_ideas(request: VideoIdeaRequest):
-    """API endpoint to generate video ideas."""
-    if not request.topic:
-      raise HTTPException(status_code=400, detail="Topic is required.")
+        for next_done in asyncio.as_completed(tasks):
+            yield json.dumps(await next_done) + "\n"
+    finally:
+        # The client went away or the batch finished; nothing left should keep running.
+        for task in tasks:
+            task.cancel()
+
+# --- Generation Pipeline ---
+# Every generator endpoint, stream, batch item and background job runs through these stages, outermost first.
+# Per-attempt rate limiting, retries, hedging and key and model routing happen inside the Gemini client.
+async def apply_budget(generation: Generation, call_next: Callable[[], Awaitable[Any]]) -> Any:
+    """Runs the generation under the endpoint's latency budget, or the client's tighter deadline."""
+    current_endpoint.set(generation.endpoint)
+    deadline = current_deadline.get()
+    budget = LATENCY_BUDGETS.get(generation.endpoint, DEFAULT_LATENCY_BUDGET)
+    if deadline is None or deadline.remaining() > budget:
+        deadline = Deadline(budget)
+        current_deadline.set(deadline)
+    generation.deadline = deadline
+    return await call_next()
+
+async def serve_cached(generation: Generation, call_next: Callable[[], Awaitable[Any]]) -> Any:
+    """Serves the generation from the response cache, generating and storing it on a miss.
+
+    Streams share their generator's entries: a hit is replayed as a single chunk, and a
+    stream that runs to the end is stored as the full text.
+    """
+    route, label, request = generation.spec.route, generation.endpoint, generation.request
+    key = stable_key(route, request.model_dump(exclude={"fresh"}))
+    if degradation.level() >= DEGRADATION_LEVELS.index("stale-cache"):
+        # Degraded: any recent result for the same inputs beats a slow or failed generation.
+        entry = await response_cache.get_stale(key, DEGRADED_STALE_FOR, label=label)
+        if entry is not None:
+            value, stale = entry
+            if stale or request.fresh:
+                mark_degraded("stale-cache")
+            return replay(value) if generation.stream else value
+    elif not request.fresh and route in STALE_WHILE_REVALIDATE:
+        entry = await response_cache.get_stale(key, STALE_WHILE_REVALIDATE[route], label=label)
+        if entry is not None:
+            value, stale = entry
+            if stale:
+                revalidator.refresh(key, lambda: revalidate(generation))
+            return replay(value) if generation.stream else value
+    elif not request.fresh:
+        value = await response_cache.get(key, label=label)
+        if value is not None:
+            return replay(value) if generation.stream else value
+    if generation.stream:
+        return stored_stream(generation, key, await call_next())
+    value = await call_next()
+    await store_result(generation, key, value)
+    return value
+
+async def store_result(generation: Generation, key: str, value: Any) -> None:
+    ttl = CACHE_TTLS.get(generation.spec.route, CACHE_DEFAULT_TTL)
+    if generation.overrides:
+        # Keep degraded output only briefly so full-quality results come back after recovery.
+        ttl = min(ttl, DEGRADED_CACHE_TTL)
+    await response_cache.set(key, value, ttl, label=generation.endpoint)
+
+async def stored_stream(generation: Generation, key: str, chunks: AsyncGenerator[str, None]) -> AsyncGenerator[str, None]:
+    """Relays a stream and caches its full text once it has run to the end."""
+    parts = []
     try:
-        video_ideas = generate_video_ideas(request.topic, request.keywords)
-    except HTTPException as e:
-        raise e
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
-    return VideoIdeaResponse(video_ideas=video_ideas)
+        async for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+    finally:
+        await chunks.aclose()
+    if parts:
+        await store_result(generation, key, "".join(parts))
+
+async def replay(text: str) -> AsyncGenerator[str, None]:
+    """A cached result as a stream of one chunk."""
+    yield text
+
+async def apply_degradation(generation: Generation, call_next: Callable[[], Awaitable[Any]]) -> Any:
+    """Applies the current degradation level's upstream overrides and notes them on the response."""
+    generation.deadline.check("no time left to generate")
+    overrides = degradation.overrides(generation.endpoint, degradation.level())
+    generation.overrides = overrides
+    current_overrides.set(overrides)
+    if "max_output_tokens" in overrides:
+        mark_degraded("short-output")
+    if "model" in overrides:
+        mark_degraded("fast-model")
+    return await call_next()
+
+async def admit(generation: Generation, call_next: Callable[[], Awaitable[Any]]) -> Any:
+    """Sets the generation's priority class and sheds it early if the wait for a slot would be too long."""
+    endpoint = generation.endpoint
+    generation.priority = lowest_priority(current_priority.get() or DEFAULT_PRIORITY, ENDPOINT_PRIORITIES.get(endpoint, DEFAULT_PRIORITY))
+    if current_job.get() is not None:
+        # Background jobs already wait in their own bounded queue.
+        return await call_next()
+    admission.admit(endpoint, generation.priority)
+    generation.admitted = True
+    try:
+        result = await call_next()
+    except BaseException:
+        arrive(generation)
+        raise
+    if generation.stream:
+        return stream_within(result, arrived_at_end(generation))
+    arrive(generation)
+    return result
+
+def arrive(generation: Generation) -> None:
+    """Stops counting an admitted generation as on its way to a slot; only the first call counts."""
+    if generation.admitted:
+        generation.admitted = False
+        admission.arrived(generation.priority)
+
+@asynccontextmanager
+async def arrived_at_end(generation: Generation):
+    try:
+        yield
+    finally:
+        arrive(generation)
 
-@app.post("/youtube/generate-post-content", response_model=PostContentResponse)
-def generate_youtube_post_content(request: PostContentRequest):
-    """API endpoint to generate YouTube post content."""
-    if not request.topic:
-      raise HTTPException(status_code=400, detail="Topic is required.")
+@asynccontextmanager
+async def recorded_outcome():
+    started = time.monotonic()
     try:
-      post_content = generate_post_content(request.topic, request.keywords, request.style)
+        yield
     except HTTPException as e:
-      raise e
-    except Exception as e:
-      raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
-    return PostContentResponse(post_content=post_content)
-
-# X (Twitter) Endpoints
-@app.post("/x/generate-tweet", response_model=TweetResponse)
-def generate_x_tweet(request: TweetRequest):
-    """API endpoint to generate tweets."""
-    if not request.topic:
-      raise HTTPException(status_code=400, detail="Topic is required.")
+        if e.status_code >= 500:
+            degradation.record(time.monotonic() - started, ok=False)
+        raise
+    degradation.record(time.monotonic() - started, ok=True)
+
+async def record_outcome(generation: Generation, call_next: Callable[[], Awaitable[Any]]) -> Any:
+    """Feeds each generation's duration and outcome, to the end of a stream, to the degradation controller."""
+    if generation.stream:
+        return stream_within(await call_next(), recorded_outcome())
+    async with recorded_outcome():
+        return await call_next()
+
+async def enforce_deadline(generation: Generation, call_next: Callable[[], Awaitable[Any]]) -> Any:
+    """Gives up with a 504 once the generation's deadline passes, including time spent waiting for a slot.
+
+    A stream only has to start in time: once its first chunk has arrived it runs to the end.
+    """
+    if generation.stream:
+        return started_in_time(generation.deadline, await call_next())
     try:
-      tweet = generate_tweet(request.topic, request.keywords, request.style)
-    except HTTPException as e:
-      raise e
-    except Exception as e:
-      raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
-    return TweetResponse(tweet=tweet)
-
-# Instagram Endpoints
-@app.post("/instagram/generate-post", response_model=InstagramPostResponse)
-def generate_instagram_post_content(request: InstagramPostRequest):
-    """API endpoint to generate Instagram post content."""
-    if not request.topic:
-      raise HTTPException(status_code=400, detail="Topic is required.")
+        return await asyncio.wait_for(call_next(), timeout=generation.deadline.remaining())
+    except asyncio.TimeoutError:
+        raise generation.deadline.exceeded("the generation did not finish in time")
+
+async def started_in_time(deadline: Deadline, chunks: AsyncGenerator[str, None]) -> AsyncGenerator[str, None]:
     try:
-      post_content = generate_instagram_post(request.topic, request.keywords, request.style)
-    except HTTPException as e:
-      raise e
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
-    return InstagramPostResponse(post_content=post_content)
+        try:
+            first = await asyncio.wait_for(chunks.__anext__(), timeout=deadline.remaining())
+        except StopAsyncIteration:
+            return
+        except asyncio.TimeoutError:
+            raise deadline.exceeded("the stream did not start in time")
+        yield first
+        async for chunk in chunks:
+            yield chunk
+    finally:
+        await chunks.aclose()
+
+async def hold_slot(generation: Generation, call_next: Callable[[], Awaitable[Any]]) -> Any:
+    """Holds a generation slot at the generation's priority while it runs, to the end of a stream."""
+    slot = queued_slot(generation, scheduler.slot(generation.priority, current_user.get() or "anonymous"))
+    if generation.stream:
+        return stream_within(await call_next(), slot)
+    async with slot:
+        return await call_next()
+
+@asynccontextmanager
+async def queued_slot(generation: Generation, slot: AsyncContextManager):
+    # From the moment it asks for a slot the scheduler counts the generation, not admission.
+    arrive(generation)
+    async with slot:
+        yield
+
+generation_pipeline = Pipeline(
+    [apply_budget, serve_cached, apply_degradation, admit, record_outcome, enforce_deadline, hold_slot],
+    call_gemini,
+)
 
-@app.post("/instagram/generate-story", response_model=InstagramStoryResponse)
-def generate_instagram_story_content(request: InstagramStoryRequest):
-    """API endpoint to generate Instagram story content."""
-    if not request.topic:
-        raise HTTPException(status_code=400, detail="Topic is required.")
+async def revalidate(generation: Generation) -> None:
+    """Regenerates a stale cache entry in the background, detached from the request that found it."""
+    current_deadline.set(None)
+    current_degradations.set(None)
+    current_priority.set("bulk")
+    await generation_pipeline.run(Generation(generation.spec, generation.request.model_copy(update={"fresh": True})))
+
+def mark_degraded(how: str) -> None:
+    """Notes that the current response was served degraded, for the X-Degraded header or batch item."""
+    marks = current_degradations.get()
+    if marks is not None:
+        marks.add(how)
+
+# --- Streaming Helpers ---
+def sse_event(data: dict, event: Optional[str] = None) -> str:
+    """Frames one server-sent event."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+async def sse_response(chunks: AsyncGenerator[str, None]) -> StreamingResponse:
+    """Forwards generated text chunks to the client as server-sent events.
+
+    The first chunk is awaited before the response starts, so upstream failures still
+    surface as a regular HTTP error; later failures arrive as an `error` event.
+    """
     try:
-        story_content = generate_instagram_story(request.topic, request.keywords, request.style)
+        first = await chunks.__anext__()
+    except StopAsyncIteration:
+        first = None
     except HTTPException as e:
         raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
-    return InstagramStoryResponse(story_content=story_content)
 
-@app.post("/instagram/suggest-channel-name", response_model=InstagramChannelNameResponse)
-def suggest_instagram_channel_name(request: InstagramChannelNameRequest):
-    """API endpoint to suggest an Instagram channel name."""
-    if not request.topic:
-        raise HTTPException(status_code=400, detail="Topic is required.")
-    try:
-        channel_name = suggest_instagram_channel_name(request.topic, request.keywords)
-    except HTTPException as e:
-      raise e
-    except Exception as e:
-      raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
-    return InstagramChannelNameResponse(channel_name=channel_name)
-
-@app.post("/instagram/generate-video-ideas", response_model=InstagramVideoIdeaResponse)
-def generate_instagram_video_ideas(request: InstagramVideoIdeaRequest):
-    """API endpoint to generate Instagram video ideas."""
-    if not request.topic:
-      raise HTTPException(status_code=400, detail="Topic is required.")
-    try:
-      video_ideas = generate_instagram_video_ideas(request.topic, request.keywords)
-    except HTTPException as e:
-      raise e
-    except Exception as e:
-      raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
-    return InstagramVideoIdeaResponse(video_ideas=video_ideas)
-
-@app.post("/instagram/suggest-niche", response_model=InstagramNicheSuggestionResponse)
-def suggest_instagram_niche(request: InstagramNicheSuggestionRequest):
-     """API endpoint to suggest Instagram channel niches."""
-     if not request.interests:
-        raise HTTPException(status_code=400, detail="Interests are required.")
-     try:
-         niche_suggestions = suggest_instagram_niche(request.interests)
-     except HTTPException as e:
-         raise e
-     except Exception as e:
-         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
-     return InstagramNicheSuggestionResponse(niche_suggestions=niche_suggestions)
-
-@app.post("/instagram/generate-reel-ideas", response_model=InstagramReelIdeaResponse)
-def generate_instagram_reel_ideas(request: InstagramReelIdeaRequest):
-    """API endpoint to generate Instagram reel ideas."""
-    if not request.topic:
-        raise HTTPException(status_code=400, detail="Topic is required.")
-    try:
-        reel_ideas = generate_instagram_reel_ideas(request.topic, request.keywords)
-    except HTTPException as e:
-        raise e
-    except Exception as e:
-         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
-    return InstagramReelIdeaResponse(reel_ideas=reel_ideas)
-
-@app.post("/instagram/generate-video-script", response_model=InstagramVideoScriptResponse)
-def generate_instagram_video_script_content(request: InstagramVideoScriptRequest):
-    """API endpoint to generate Instagram video script."""
-    if not request.topic:
-        raise HTTPException(status_code=400, detail="Topic is required.")
-    try:
-        script = generate_instagram_video_script(request.topic, request.style)
-    except HTTPException as e:
-        raise e
-    except Exception as e:
-         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
-    return InstagramVideoScriptResponse(script=script)
-
-# Email Endpoints
-@app.post("/email/generate-email", response_model=EmailResponse)
-def generate_email_content(request: EmailRequest):
-    """API endpoint to generate email content."""
-    if not request.topic:
-        raise HTTPException(status_code=400, detail="Topic is required.")
+    async def events():
+        try:
+            if first is not None:
+                yield sse_event({"text": first})
+                async for chunk in chunks:
+                    yield sse_event({"text": chunk})
+            yield sse_event({}, event="done")
+        except HTTPException as e:
+            yield sse_event({"detail": e.detail}, event="error")
+        except Exception as e:
+            yield sse_event({"detail": f"An unexpected error occurred: {e}"}, event="error")
+        finally:
+            # Closes the upstream stream too when the client goes away mid-generation.
+            await chunks.aclose()
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
+
+# --- API Endpoints ---
+# Generator Endpoints
+def add_generator_routes(spec: GeneratorSpec) -> None:
+    """Serves one generator from the registry, plus its server-sent events variant if it streams."""
+    async def generate(request: spec.request_model):
+        missing = spec.missing(request)
+        if missing:
+            raise HTTPException(status_code=400, detail=missing)
+        try:
+            value = await generation_pipeline.run(Generation(spec, request))
+        except HTTPException as e:
+            raise e
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
+        return spec.response(value)
+
+    async def stream(request: spec.request_model):
+        missing = spec.missing(request)
+        if missing:
+            raise HTTPException(status_code=400, detail=missing)
+        return await sse_response(await generation_pipeline.run(Generation(spec, request, stream=True)))
+
+    app.add_api_route(spec.route, generate, methods=["POST"], response_model=spec.response_model,
+                      name=spec.name, description=f"API endpoint to generate {spec.what}.")
+    if spec.stream:
+        app.add_api_route(spec.stream_route, stream, methods=["POST"], name=f"stream_{spec.name}",
+                          description=f"API endpoint to stream {spec.what} as server-sent events.")
+
+for generator in GENERATORS:
+    add_generator_routes(generator)
+
+# Batch Endpoints
+@app.post("/batch")
+async def generate_batch(request: BatchRequest):
+    """API endpoint to run many generations at once, streamed back as NDJSON as they complete."""
+    if not request.jobs:
+        raise HTTPException(status_code=400, detail="At least one job is required.")
+    if len(request.jobs) > BATCH_MAX_JOBS:
+        raise HTTPException(status_code=413, detail=f"A batch can contain at most {BATCH_MAX_JOBS} jobs.")
+    concurrency = min(request.concurrency or BATCH_CONCURRENCY, BATCH_MAX_CONCURRENCY)
+    if concurrency < 1:
+        raise HTTPException(status_code=400, detail="Concurrency must be at least 1.")
+    return StreamingResponse(stream_batch(request.jobs, concurrency), media_type="application/x-ndjson")
+
+# Job Endpoints
+@app.post("/jobs", response_model=JobResponse, status_code=202)
+async def submit_job(request: JobRequest):
+    """API endpoint to queue a generation in the background; returns the job to poll."""
+    parse_job(request.generator, request.params)
     try:
-        email_content = generate_email(request.topic, request.style, request.keywords)
-    except HTTPException as e:
-        raise e
+        return await job_queue.submit(request.generator, request.params, current_priority.get() or DEFAULT_PRIORITY,
+                                      current_user.get() or "anonymous")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
-    return EmailResponse(email_content=email_content)
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    """API endpoint returning a job's state, and its result once finished."""
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """API endpoint streaming a job's state changes as server-sent events until it finishes."""
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+
+    async def events():
+        current = job
+        status = None
+        while True:
+            if current is None:
+                yield sse_event({"detail": "Job not found."}, event="error")
+                return
+            if current["status"] != status:
+                status = current["status"]
+                yield sse_event(JobResponse(**current).model_dump(), event="status")
+            if status in FINISHED_STATUSES:
+                yield sse_event({}, event="done")
+                return
+            await job_queue.wait_for_change(JOB_POLL_INTERVAL)
+            current = await job_queue.get(job_id)
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
+
+# Operations Endpoints
+@app.get("/metrics")
+async def get_metrics():
+    """API endpoint exposing cache, coalescing, rate limiter, resilience and scheduling counters."""
+    return {
+        "cache": await response_cache.stats(),
+        "revalidation": revalidator.stats(),
+        "idempotency": idempotency.stats(),
+        "cancellations": {**disconnects.stats(), **gemini.stats()},
+        "coalescing": gemini.flights.stats(),
+        "context_cache": context_cache.stats() if context_cache is not None else {"enabled": False},
+        "rate_limiter": rate_limiter.stats(),
+        "api_keys": key_pool.stats() if key_pool is not None else None,
+        "resilience": resilience.stats(),
+        "latency": latency_tracker.stats(),
+        "routing": model_router.stats(),
+        "hedging": hedger.stats() if hedger is not None else {"enabled": False},
+        "jobs": await job_queue.stats(),
+        "scheduler": scheduler.stats(),
+        "admission": admission.stats(),
+        "degradation": degradation.stats(),
+    }
+
+def require_admin(request: Request) -> None:
+    if not ADMIN_TOKEN or request.headers.get("X-Admin-Token") != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin access is not allowed.")
+
+@app.get("/admin/admission")
+async def get_admission_settings(request: Request):
+    """API endpoint returning the admission control limits and counters."""
+    require_admin(request)
+    return admission.stats()
+
+@app.put("/admin/admission")
+async def update_admission_settings(request: Request, settings: AdmissionSettings):
+    """API endpoint to retune admission control without a restart."""
+    require_admin(request)
+    admission.configure(max_wait=settings.max_wait_seconds, max_queued=settings.max_queued)
+    return admission.stats()
+
+@app.get("/health/upstream")
+async def get_upstream_health():
+    """API endpoint reporting the Gemini circuit breaker state."""
+    breaker = resilience.breaker.stats()
+    return {"healthy": breaker["state"] == "closed", "circuit_breaker": breaker}
 
 
 if __name__ == "__main__":
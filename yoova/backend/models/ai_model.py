@@ -0,0 +1,337 @@
+import asyncio
+import json
+import math
+import re
+import time
+import httpx
+from fastapi import HTTPException
+from typing import Any, AsyncGenerator, Optional, Tuple, Union
+
+from services.coalesce_service import SingleFlight
+from services.context_cache_service import ContextCache
+from services.hedge_service import Hedger
+from services.key_pool_service import ApiKey, KeyPool
+from services.limiter_service import RateLimiter, estimate_tokens
+from services.metrics_service import LatencyTracker
+from services.resilience_service import TRANSIENT_STATUSES, Resilience, UpstreamUnavailable
+from services.router_service import ModelRouter
+from utils.helpers import current_deadline, current_endpoint, current_overrides, stable_key
+
+
+class GeminiClient:
+    """Long-lived, pooled upstream client shared by every Gemini generator.
+
+    `agenerate_text` runs on the event loop so one process can keep hundreds of generations
+    in flight. Identical concurrent requests share one upstream call, which waits for quota
+    on the limiter and is retried behind the circuit breaker when it fails transiently.
+    Async calls that run slower than usual for their endpoint may be hedged. With a router,
+    each generation goes to the model it picks for the endpoint instead of `api_url`. With a
+    context cache, long system instructions are referenced by cachedContents handle.
+    """
+
+    def __init__(self, api_url: str, api_key: Optional[str], pool_size: int = 200, timeout: float = 60,
+                 limiter: Optional[RateLimiter] = None, resilience: Optional[Resilience] = None,
+                 latency: Optional[LatencyTracker] = None, hedger: Optional[Hedger] = None,
+                 keys: Optional[KeyPool] = None, router: Optional[ModelRouter] = None,
+                 context_cache: Optional[ContextCache] = None):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.limiter = limiter
+        self.resilience = resilience
+        self.latency = latency
+        self.hedger = hedger
+        self.keys = keys
+        self.router = router
+        self.context_cache = context_cache
+        self.async_client: Optional[httpx.AsyncClient] = None
+        self.flights = SingleFlight()
+        self.cancelled = 0
+        self.cancelled_tokens = 0
+
+    @staticmethod
+    def stream_url(url: str) -> str:
+        """streamGenerateContent endpoint for the same model, framed as server-sent events."""
+        return url.replace(":generateContent", ":streamGenerateContent") + "?alt=sse"
+
+    def routed_url(self) -> str:
+        """generateContent URL of the model picked for the current endpoint."""
+        if self.router is None:
+            return self.api_url
+        return self.router.url(self.router.choose(current_endpoint.get()))
+
+    @property
+    def headers(self) -> dict:
+        return {
+            "Content-Type": "application/json",
+            "Connection": "keep-alive",
+            "x-goog-api-key": f"{self.api_key}",
+        }
+
+    def open(self) -> None:
+        """Creates the keep-alive connection pool. Called once at app startup."""
+        if self.async_client is None:
+            limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+            self.async_client = httpx.AsyncClient(headers=self.headers, limits=limits, timeout=None)
+
+    async def aclose(self) -> None:
+        """Closes every pooled connection. Called once at app shutdown."""
+        if self.async_client is not None:
+            await self.async_client.aclose()
+            self.async_client = None
+
+    async def agenerate_json(self, payload: dict, what: str) -> Any:
+        """Like `agenerate_text` for payloads that request a JSON response; returns the decoded value."""
+        text = await self.agenerate_text(payload, what)
+        try:
+            return json.loads(text)
+        except ValueError:
+            raise HTTPException(status_code=500, detail="Error processing response from Gemini API")
+
+    def flight_key(self, payload: dict, url: Optional[str] = None) -> str:
+        """Key under which identical (normalized) upstream requests are coalesced."""
+        return stable_key(url or self.api_url, {"payload": json.dumps(payload, sort_keys=True)})
+
+    def _overridden(self, payload: dict) -> Tuple[dict, str]:
+        """Payload and URL for this generation after any degradation overrides in `current_overrides`."""
+        overrides = current_overrides.get() or {}
+        if "model" in overrides:
+            url = re.sub(r"/models/[^/:]+:", f"/models/{overrides['model']}:", self.api_url)
+        else:
+            url = self.routed_url()
+        if "max_output_tokens" in overrides:
+            config = dict(payload.get("generationConfig", {}))
+            config["maxOutputTokens"] = min(config.get("maxOutputTokens", overrides["max_output_tokens"]), overrides["max_output_tokens"])
+            payload = {**payload, "generationConfig": config}
+        return payload, url
+
+    async def agenerate_text(self, payload: dict, what: str) -> str:
+        """Posts a generateContent payload on the shared httpx pool and returns the first candidate's text."""
+        payload, url = self._overridden(payload)
+        return await self.flights.ado(self.flight_key(payload, url), self._agenerate_text, payload, what, url)
+
+    async def _agenerate_text(self, payload: dict, what: str, url: str) -> str:
+        if self.async_client is None:
+            self.open()
+        estimate = estimate_tokens(payload)
+        endpoint = current_endpoint.get() or what
+        if self.hedger is not None:
+            response = await self.hedger.run(endpoint, lambda: self._asend(payload, what, estimate, endpoint, url))
+        else:
+            response = await self._asend(payload, what, estimate, endpoint, url)
+        return self._parse_text(response.status_code, response.headers, response.json, response.text, what, estimate)
+
+    def _attempt_timeout(self, what: str, stream: bool = False) -> Union[float, httpx.Timeout]:
+        """Timeout for the next upstream attempt, shortened to what is left of the request's deadline.
+
+        A stream only has to start within the deadline (its first chunk is awaited against it by
+        the caller), so only connecting is shortened; reads between chunks keep the full timeout.
+        """
+        deadline = current_deadline.get()
+        if deadline is None:
+            return self.timeout
+        deadline.check(f"no time left to call Gemini for {what}")
+        if stream:
+            return httpx.Timeout(self.timeout, connect=deadline.timeout(self.timeout))
+        return deadline.timeout(self.timeout)
+
+    def _timed_out(self, what: str) -> Exception:
+        deadline = current_deadline.get()
+        if deadline is not None and deadline.remaining() <= 0.01:
+            return deadline.exceeded(f"Gemini did not finish generating {what} in time")
+        return UpstreamUnavailable(504, f"Timed out generating {what} with Gemini API.")
+
+    async def _asend(self, payload: dict, what: str, estimate: int, endpoint: str, url: str) -> httpx.Response:
+        """Runs one generateContent request through the retry layer and records its latency."""
+        deadline = current_deadline.get()
+        if deadline is not None and self.latency is not None:
+            # Do not start work that typically cannot finish before the deadline.
+            expected = self.latency.percentile(endpoint, 50) or 0.0
+            deadline.check(f"{what} usually takes {expected:.1f}s", needed=expected)
+        started = time.monotonic()
+        try:
+            if self.resilience is not None:
+                response = await self.resilience.acall(self._apost, payload, what, estimate, url)
+            else:
+                response = await self._apost(payload, what, estimate, url)
+        except HTTPException as e:
+            if self.router is not None and e.status_code >= 500:
+                self.router.record(endpoint, url, time.monotonic() - started, ok=False)
+            raise
+        if response.status_code == 200:
+            if self.latency is not None:
+                self.latency.record(endpoint, time.monotonic() - started)
+            if self.router is not None:
+                self.router.record(endpoint, url, time.monotonic() - started, ok=True)
+        return response
+
+    async def _apost(self, payload: dict, what: str, estimate: int, url: Optional[str] = None,
+                     stream: bool = False) -> httpx.Response:
+        """One async upstream attempt; with `stream` the caller must close the returned response."""
+        for attempt in range(self.max_sends):
+            if self.limiter is not None:
+                await self.limiter.aacquire(estimate)
+            key = self.keys.acquire(estimate) if self.keys is not None else None
+            sent, cache_key = payload, None
+            if self.context_cache is not None:
+                sent, cache_key = await self.context_cache.apply(self.async_client, payload, url or self.api_url,
+                                                                 key.key if key is not None else self.api_key)
+            request = self.async_client.build_request("POST", url or self.api_url, json=sent, headers=self._key_headers(key),
+                                                      timeout=self._attempt_timeout(what, stream))
+            try:
+                response = await self.async_client.send(request, stream=stream)
+            except asyncio.CancelledError:
+                self._record_cancelled(estimate)
+                raise
+            except httpx.TimeoutException:
+                raise self._timed_out(what)
+            except httpx.TransportError as e:
+                raise UpstreamUnavailable(502, f"Could not reach Gemini API while generating {what}: {e}")
+            if response.status_code != 200 and stream:
+                await response.aread()
+                await response.aclose()
+            if cache_key is not None and response.status_code in (400, 404) and "cachedcontent" in response.text.lower().replace(" ", ""):
+                # The handle expired or was deleted upstream: register the prefix again and resend.
+                self.context_cache.invalidate(cache_key)
+                continue
+            if response.status_code not in (429, 403) or not self._should_resend(
+                    response.status_code, response.headers, response.text, key, attempt):
+                break
+        if response.status_code in TRANSIENT_STATUSES:
+            raise UpstreamUnavailable(response.status_code, f"Error generating {what} with Gemini API: {response.text}", response)
+        return response
+
+    @staticmethod
+    def _key_headers(key: Optional[ApiKey]) -> Optional[dict]:
+        return {"x-goog-api-key": key.key} if key is not None else None
+
+    @property
+    def max_sends(self) -> int:
+        """Sends per attempt: one per pooled key, plus one requeue behind the limiter."""
+        return 1 + (len(self.keys.keys) if self.keys is not None else 1)
+
+    def _should_resend(self, status_code: int, headers, body: str, key: Optional[ApiKey], attempt: int) -> bool:
+        """Handles a 429 or 403 from one send; True if the request should be sent again.
+
+        While another key is available the refused key leaves the rotation and the request
+        goes straight to the other one; otherwise a 429 requeues behind the limiter, which
+        now waits out the upstream retry delay.
+        """
+        rotated = key is not None and self.keys.penalize(
+            key, status_code, retry_after_seconds(headers, body, default=None) if status_code == 429 else None)
+        if attempt + 1 >= self.max_sends:
+            return False
+        if rotated:
+            return True
+        if status_code != 429 or self.limiter is None:
+            return False
+        self.limiter.on_throttled(retry_after_seconds(headers, body))
+        return True
+
+    async def astream_text(self, payload: dict, what: str) -> AsyncGenerator[str, None]:
+        """Yields text chunks from streamGenerateContent as Gemini produces them.
+
+        Only opening the stream is retried; once text has been yielded a failure is final.
+        The router is told how long the stream took to open and whether it ran to the end.
+        """
+        if self.async_client is None:
+            self.open()
+        payload, routed = self._overridden(payload)
+        url = self.stream_url(routed)
+        estimate = estimate_tokens(payload)
+        endpoint = current_endpoint.get() or what
+        started = time.monotonic()
+        try:
+            if self.resilience is not None:
+                response = await self.resilience.acall(self._apost, payload, what, estimate, url, True)
+            else:
+                response = await self._apost(payload, what, estimate, url, True)
+        except HTTPException as e:
+            if self.router is not None and e.status_code >= 500:
+                self.router.record(endpoint, routed, time.monotonic() - started, ok=False)
+            raise
+        if response.status_code != 200:
+            self._raise_for_status(response.status_code, response.headers, response.text, what)
+        opened = time.monotonic() - started
+        try:
+            usage = None
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                try:
+                    chunk = json.loads(line[len("data:"):])
+                    candidates = chunk.get("candidates") or [{}]
+                    # The closing chunk may only carry a finishReason.
+                    parts = candidates[0].get("content", {}).get("parts", [])
+                except (AttributeError, ValueError):
+                    raise HTTPException(status_code=500, detail="Error processing response from Gemini API")
+                usage = chunk.get("usageMetadata", {}).get("totalTokenCount", usage)
+                text = "".join(part.get("text", "") for part in parts)
+                if text:
+                    yield text
+        except httpx.TransportError as e:
+            if self.router is not None:
+                self.router.record(endpoint, routed, opened, ok=False)
+            raise HTTPException(status_code=502, detail=f"Gemini API stream for {what} was interrupted: {e}")
+        except (asyncio.CancelledError, GeneratorExit):
+            # Abandoned mid-stream: closing the response stops the generation upstream.
+            self._record_cancelled(estimate)
+            raise
+        finally:
+            await response.aclose()
+        if self.router is not None:
+            self.router.record(endpoint, routed, opened, ok=True)
+        if self.limiter is not None:
+            self.limiter.on_success(estimate, usage)
+
+    def _record_cancelled(self, estimate: int) -> None:
+        self.cancelled += 1
+        self.cancelled_tokens += estimate
+
+    def stats(self) -> dict:
+        """Upstream calls abandoned mid-flight (client gone, hedge lost) and their estimated token cost."""
+        return {"upstream_cancelled": self.cancelled, "estimated_tokens_saved": self.cancelled_tokens}
+
+    def _parse_text(self, status_code: int, headers, load_json, body: str, what: str, estimate: int) -> str:
+        if status_code == 200:
+            try:
+                result = load_json()
+                text = result["candidates"][0]["content"]["parts"][0]["text"]
+            except (KeyError, IndexError, ValueError):
+                raise HTTPException(status_code=500, detail="Error processing response from Gemini API")
+            if self.limiter is not None:
+                self.limiter.on_success(estimate, result.get("usageMetadata", {}).get("totalTokenCount"))
+            return text
+        else:
+            self._raise_for_status(status_code, headers, body, what)
+
+    def _raise_for_status(self, status_code: int, headers, body: str, what: str) -> None:
+        if status_code == 429:
+            if self.limiter is not None and (self.keys is None or self.keys.available() <= 1):
+                self.limiter.on_throttled(retry_after_seconds(headers, body))
+            # Our quota is exhausted, not the caller's: tell them when to come back.
+            raise HTTPException(
+                status_code=503,
+                detail=f"Gemini quota exhausted while generating {what}, please retry later.",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after_seconds(headers, body))))},
+            )
+        raise HTTPException(status_code=status_code, detail=f"Error generating {what} with Gemini API: {body}")
+
+
+def retry_after_seconds(headers, body: str, default: Optional[float] = 1.0) -> Optional[float]:
+    """Reads the upstream retry hint from a Retry-After header or a RetryInfo retryDelay like "27s"."""
+    retry_after = headers.get("Retry-After") if headers else None
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+    try:
+        for detail in json.loads(body).get("error", {}).get("details", []):
+            delay = detail.get("retryDelay")
+            if isinstance(delay, str) and delay.endswith("s"):
+                return max(0.0, float(delay[:-1]))
+    except (AttributeError, ValueError):
+        pass
+    return default
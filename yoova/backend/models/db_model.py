@@ -0,0 +1,218 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, List, Optional, Tuple
+
+DEFAULT_DATABASE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "database", "database.db")
+
+
+class Database:
+    """Thread-local SQLite connections to database.db in WAL mode.
+
+    WAL lets every uvicorn worker process read while another one writes, so tables in
+    here can be shared across processes.
+    """
+
+    def __init__(self, path: str = DEFAULT_DATABASE_PATH):
+        self.path = path
+        self._local = threading.local()
+
+    def connect(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            # auto_vacuum only takes effect on a database without tables, i.e. the first connect.
+            connection.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+
+class ResponseCacheStore:
+    """Persistent response cache table, shared by every worker process and restart.
+
+    Rows are keyed by the request key hash and carry an absolute expiry. Expired rows are
+    kept for another `grace` seconds, so they can still be served stale on request, then
+    deleted (and their pages reclaimed) at most once per `vacuum_interval` seconds.
+    """
+
+    def __init__(self, database: Database, vacuum_interval: float = 300, grace: float = 0):
+        self.database = database
+        self.vacuum_interval = vacuum_interval
+        self.grace = grace
+        self.hits = 0
+        self.misses = 0
+        self.purged = 0
+        self._last_vacuum = 0.0
+        self._lock = threading.Lock()
+        self.database.connect().executescript("""
+            CREATE TABLE IF NOT EXISTS response_cache (
+                key_hash TEXT PRIMARY KEY,
+                endpoint TEXT NOT NULL,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_response_cache_expires_at ON response_cache (expires_at);
+        """)
+
+    def get(self, key: str, stale_for: float = 0) -> Optional[Tuple[Any, float]]:
+        """Returns (value, expires_at) for a live row, or one expired less than `stale_for` seconds ago."""
+        row = self.database.connect().execute(
+            "SELECT value, expires_at FROM response_cache WHERE key_hash = ? AND expires_at > ?",
+            (key, time.time() - stale_for),
+        ).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0]), row[1]
+
+    def set(self, key: str, endpoint: str, value: Any, ttl: float) -> None:
+        now = time.time()
+        self.database.connect().execute(
+            "INSERT OR REPLACE INTO response_cache (key_hash, endpoint, value, created_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+            (key, endpoint, json.dumps(value), now, now + ttl),
+        )
+        if now - self._last_vacuum >= self.vacuum_interval:
+            self.vacuum()
+
+    def vacuum(self) -> int:
+        """Deletes rows past their grace period and returns freed pages to the filesystem."""
+        self._last_vacuum = time.time()
+        connection = self.database.connect()
+        deleted = connection.execute("DELETE FROM response_cache WHERE expires_at <= ?", (self._last_vacuum - self.grace,)).rowcount
+        connection.execute("PRAGMA incremental_vacuum").fetchall()
+        with self._lock:
+            self.purged += deleted
+        return deleted
+
+    def stats(self) -> dict:
+        rows = self.database.connect().execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "rows": rows, "purged": self.purged}
+
+
+class JobStore:
+    """Persistent table of background generation jobs and their results.
+
+    A job moves from queued to running to succeeded or failed. Claiming is a single
+    conditional UPDATE, so when several processes resume the same queued job on boot
+    only one of them runs it. Finished jobs are deleted `retention` seconds after they end.
+    """
+
+    def __init__(self, database: Database, retention: float = 24 * 3600, purge_interval: float = 300):
+        self.database = database
+        self.retention = retention
+        self.purge_interval = purge_interval
+        self.purged = 0
+        self._last_purge = 0.0
+        self.database.connect().executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                generator TEXT NOT NULL,
+                params TEXT NOT NULL,
+                priority TEXT NOT NULL DEFAULT 'standard',
+                user_id TEXT NOT NULL DEFAULT 'anonymous',
+                status TEXT NOT NULL,
+                status_code INTEGER,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at);
+        """)
+        self._add_column("priority", "TEXT NOT NULL DEFAULT 'standard'")
+        self._add_column("user_id", "TEXT NOT NULL DEFAULT 'anonymous'")
+
+    def _add_column(self, name: str, definition: str) -> None:
+        """Brings a jobs table created by an older version up to date."""
+        connection = self.database.connect()
+        if name not in {row[1] for row in connection.execute("PRAGMA table_info(jobs)")}:
+            connection.execute(f"ALTER TABLE jobs ADD COLUMN {name} {definition}")
+
+    def create(self, job_id: str, generator: str, params: dict, priority: str, user_id: str) -> None:
+        now = time.time()
+        self.database.connect().execute(
+            "INSERT INTO jobs (id, generator, params, priority, user_id, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, 'queued', ?, ?)",
+            (job_id, generator, json.dumps(params), priority, user_id, now, now),
+        )
+        if now - self._last_purge >= self.purge_interval:
+            self.purge()
+
+    def get(self, job_id: str) -> Optional[dict]:
+        row = self.database.connect().execute(
+            "SELECT id, generator, params, priority, user_id, status, status_code, result, error, created_at, updated_at FROM jobs WHERE id = ?",
+            (job_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "id": row[0],
+            "generator": row[1],
+            "params": json.loads(row[2]),
+            "priority": row[3],
+            "user_id": row[4],
+            "status": row[5],
+            "status_code": row[6],
+            "result": json.loads(row[7]) if row[7] is not None else None,
+            "error": json.loads(row[8]) if row[8] is not None else None,
+            "created_at": row[9],
+            "updated_at": row[10],
+        }
+
+    def claim(self, job_id: str) -> bool:
+        """Marks a queued job as running; False if it is gone or someone else took it."""
+        return self.database.connect().execute(
+            "UPDATE jobs SET status = 'running', updated_at = ? WHERE id = ? AND status = 'queued'",
+            (time.time(), job_id),
+        ).rowcount == 1
+
+    def finish(self, job_id: str, status_code: int, result: Any = None, error: Any = None) -> None:
+        self.database.connect().execute(
+            "UPDATE jobs SET status = ?, status_code = ?, result = ?, error = ?, updated_at = ? WHERE id = ?",
+            (
+                "succeeded" if status_code == 200 else "failed",
+                status_code,
+                json.dumps(result) if result is not None else None,
+                json.dumps(error) if error is not None else None,
+                time.time(),
+                job_id,
+            ),
+        )
+
+    def requeue(self, job_id: str) -> None:
+        """Puts a running job back in the queue, e.g. when its worker shuts down mid-generation."""
+        self.database.connect().execute(
+            "UPDATE jobs SET status = 'queued', updated_at = ? WHERE id = ? AND status = 'running'",
+            (time.time(), job_id),
+        )
+
+    def pending(self, stale_after: float) -> List[str]:
+        """Ids of jobs to resume: every queued job, plus running ones whose worker died `stale_after` seconds ago."""
+        connection = self.database.connect()
+        now = time.time()
+        connection.execute(
+            "UPDATE jobs SET status = 'queued', updated_at = ? WHERE status = 'running' AND updated_at <= ?",
+            (now, now - stale_after),
+        )
+        rows = connection.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at").fetchall()
+        return [row[0] for row in rows]
+
+    def purge(self) -> int:
+        """Deletes jobs that finished more than `retention` seconds ago."""
+        self._last_purge = time.time()
+        deleted = self.database.connect().execute(
+            "DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND updated_at <= ?",
+            (self._last_purge - self.retention,),
+        ).rowcount
+        self.purged += deleted
+        return deleted
+
+    def stats(self) -> dict:
+        rows = self.database.connect().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {"jobs": dict(rows), "purged": self.purged}
@@ -0,0 +1,244 @@
+import os
+from typing import List, Literal, Optional, get_args
+
+from fastapi import HTTPException
+from pydantic import BaseModel, Field
+
+from services.pipeline_service import GeneratorSpec
+
+# Upper bound for the `count` of distinct options a name/tweet/idea request can ask for.
+MAX_CANDIDATES = int(os.getenv("MAX_CANDIDATES", "10"))
+
+class GenerationRequest(BaseModel):
+    """Fields shared by every generation request."""
+    fresh: Optional[bool] = False  # Skip the response cache and force a new generation.
+
+# --- YouTube Related Models ---
+class ScriptRequest(GenerationRequest):
+    topic: str
+    style: Optional[str] = "informative"
+
+class ScriptResponse(BaseModel):
+    script: str
+
+class ChannelNameRequest(GenerationRequest):
+    topic: str
+    keywords: Optional[str] = None
+    count: Optional[int] = Field(1, ge=1, le=MAX_CANDIDATES)  # Distinct options returned from one upstream call.
+
+class ChannelNameResponse(BaseModel):
+    channel_name: str
+    candidates: List[str] = []
+
+class NicheSuggestionRequest(GenerationRequest):
+    interests: str
+
+class NicheSuggestionResponse(BaseModel):
+    niche_suggestions: str
+
+class VideoIdeaRequest(GenerationRequest):
+    topic: str
+    keywords: Optional[str] = None
+    count: Optional[int] = Field(1, ge=1, le=MAX_CANDIDATES)  # Distinct options returned from one upstream call.
+
+class VideoIdeaResponse(BaseModel):
+    video_ideas: str
+    candidates: List[str] = []
+
+class PostContentRequest(GenerationRequest):
+    topic: str
+    keywords: Optional[str] = None
+    style: Optional[str] = "engaging"
+
+class PostContentResponse(BaseModel):
+    post_content: str
+    
+# --- X (Twitter) Related Models ---
+class TweetRequest(GenerationRequest):
+    topic: str
+    keywords: Optional[str] = None
+    style: Optional[str] = "engaging"
+    count: Optional[int] = Field(1, ge=1, le=MAX_CANDIDATES)  # Distinct options returned from one upstream call.
+
+class TweetResponse(BaseModel):
+    tweet: str
+    candidates: List[str] = []
+
+# --- Instagram Related Models ---
+class InstagramPostRequest(GenerationRequest):
+    topic: str
+    keywords: Optional[str] = None
+    style: Optional[str] = "engaging"
+
+class InstagramPostResponse(BaseModel):
+    post_content: str
+
+class InstagramStoryRequest(GenerationRequest):
+    topic: str
+    keywords: Optional[str] = None
+    style: Optional[str] = "engaging"
+
+class InstagramStoryResponse(BaseModel):
+    story_content: str
+
+class InstagramChannelNameRequest(GenerationRequest):
+    topic: str
+    keywords: Optional[str] = None
+    count: Optional[int] = Field(1, ge=1, le=MAX_CANDIDATES)  # Distinct options returned from one upstream call.
+
+class InstagramChannelNameResponse(BaseModel):
+    channel_name: str
+    candidates: List[str] = []
+
+class InstagramVideoIdeaRequest(GenerationRequest):
+    topic: str
+    keywords: Optional[str] = None
+    count: Optional[int] = Field(1, ge=1, le=MAX_CANDIDATES)  # Distinct options returned from one upstream call.
+
+class InstagramVideoIdeaResponse(BaseModel):
+    video_ideas: str
+    candidates: List[str] = []
+
+class InstagramNicheSuggestionRequest(GenerationRequest):
+    interests: str
+
+class InstagramNicheSuggestionResponse(BaseModel):
+    niche_suggestions: str
+
+class InstagramReelIdeaRequest(GenerationRequest):
+    topic: str
+    keywords: Optional[str] = None
+    count: Optional[int] = Field(1, ge=1, le=MAX_CANDIDATES)  # Distinct options returned from one upstream call.
+
+class InstagramReelIdeaResponse(BaseModel):
+    reel_ideas: str
+    candidates: List[str] = []
+
+class InstagramVideoScriptRequest(GenerationRequest):
+    topic: str
+    style: Optional[str] = "informative"
+
+class InstagramVideoScriptResponse(BaseModel):
+    script: str
+
+# --- Email Related Models ---
+class EmailRequest(GenerationRequest):
+    topic: str
+    style: Optional[str] = "professional"
+    keywords: Optional[str] = None
+
+class EmailResponse(BaseModel):
+    email_content: str
+
+# --- Content Pack Related Models ---
+ContentPackArtifact = Literal["youtube_script", "youtube_post", "tweet", "instagram_caption", "email"]
+
+class ContentPackRequest(GenerationRequest):
+    topic: str
+    keywords: Optional[str] = None
+    style: Optional[str] = "engaging"
+    artifacts: List[ContentPackArtifact] = list(get_args(ContentPackArtifact))
+
+class ContentPackResponse(BaseModel):
+    youtube_script: Optional[str] = None
+    youtube_post: Optional[str] = None
+    tweet: Optional[str] = None
+    instagram_caption: Optional[str] = None
+    email: Optional[str] = None
+
+# --- Content Pack Prompt ---
+# What each content pack artifact should contain.
+CONTENT_PACK_INSTRUCTIONS = {
+    "youtube_script": "a high quality YouTube video script",
+    "youtube_post": "a YouTube community text post",
+    "tweet": "a concise tweet, under 280 characters",
+    "instagram_caption": "an Instagram post caption with relevant hashtags",
+    "email": "an email",
+}
+
+def content_pack_artifacts(request: ContentPackRequest) -> List[str]:
+    return list(dict.fromkeys(request.artifacts))
+
+def content_pack_prompt(request: ContentPackRequest) -> str:
+    wanted = "\n".join(f"- {name}: {CONTENT_PACK_INSTRUCTIONS[name]}" for name in content_pack_artifacts(request))
+    return f"For the topic '{request.topic}' in a '{request.style}' style, write each of the following:\n{wanted}"
+
+def content_pack_schema(request: ContentPackRequest) -> dict:
+    artifacts = content_pack_artifacts(request)
+    return {"type": "OBJECT", "properties": {name: {"type": "STRING"} for name in artifacts}, "required": artifacts}
+
+def content_pack_result(request: ContentPackRequest, pack) -> dict:
+    """The requested artifacts from Gemini's structured output; all of them must be there."""
+    artifacts = content_pack_artifacts(request)
+    if not isinstance(pack, dict) or any(not isinstance(pack.get(name), str) for name in artifacts):
+        raise HTTPException(status_code=500, detail="Error processing response from Gemini API")
+    return {name: pack[name] for name in artifacts}
+
+# --- Generator Registry ---
+# Every generation endpoint, served through the same pipeline in app.py. The name is what /batch and /jobs
+# call it by; per-endpoint tuning left unset falls back to the app-wide defaults.
+GENERATORS = [
+    # YouTube
+    GeneratorSpec("script", "/youtube/generate-script", ScriptRequest, ScriptResponse, "script", "script",
+                  "Generate a video script about '{topic}' in a '{style}' style.",
+                  persona="script_writer", stream=True, budget=90, cache_ttl=6 * 3600, length="long"),
+    GeneratorSpec("channel_name", "/youtube/suggest-channel-name", ChannelNameRequest, ChannelNameResponse, "channel_name", "channel name",
+                  "Suggest a unique and catchy YouTube channel name about '{topic}'.",
+                  keywords_hint="Include these keywords: {keywords}.", candidates=True, budget=20, cache_ttl=3600, length="short"),
+    GeneratorSpec("niche", "/youtube/suggest-niche", NicheSuggestionRequest, NicheSuggestionResponse, "niche_suggestions", "niche suggestions",
+                  "Based on the following interests: {interests}, suggest several specific YouTube channel niches "
+                  "that could be successful, along with reasons why.",
+                  persona="niche_expert", required=(("interests", "Interests are required."),),
+                  budget=45, cache_ttl=1800, revalidate=True),
+    GeneratorSpec("video_ideas", "/youtube/generate-video-ideas", VideoIdeaRequest, VideoIdeaResponse, "video_ideas", "video ideas",
+                  "Suggest several creative and engaging video ideas about '{topic}'.",
+                  keywords_hint="Consider these keywords: {keywords}.", candidates=True, budget=45, cache_ttl=1800, revalidate=True),
+    GeneratorSpec("post_content", "/youtube/generate-post-content", PostContentRequest, PostContentResponse, "post_content", "post content",
+                  "Generate a YouTube text post about '{topic}' in a '{style}' style.",
+                  keywords_hint="Include these keywords: {keywords}.", budget=45, cache_ttl=3600),
+    # X (Twitter)
+    GeneratorSpec("tweet", "/x/generate-tweet", TweetRequest, TweetResponse, "tweet", "tweet",
+                  "Generate a concise tweet about '{topic}' in a '{style}' style. Keep it under 280 characters.",
+                  keywords_hint="Include these keywords: {keywords}.", candidates=True, budget=20, cache_ttl=900, length="short"),
+    # Instagram
+    GeneratorSpec("instagram_post", "/instagram/generate-post", InstagramPostRequest, InstagramPostResponse, "post_content", "Instagram post content",
+                  "Generate engaging content for an Instagram post about '{topic}' in a '{style}' style. Include relevant hashtags.",
+                  keywords_hint="Consider these keywords: {keywords}.", budget=45, cache_ttl=3600),
+    GeneratorSpec("instagram_story", "/instagram/generate-story", InstagramStoryRequest, InstagramStoryResponse, "story_content", "Instagram story content",
+                  "Generate engaging content for an Instagram story about '{topic}' in a '{style}' style. "
+                  "The content should be concise and attention-grabbing.",
+                  keywords_hint="Consider these keywords: {keywords}.", budget=45, cache_ttl=3600),
+    GeneratorSpec("instagram_channel_name", "/instagram/suggest-channel-name", InstagramChannelNameRequest, InstagramChannelNameResponse,
+                  "channel_name", "Instagram channel name",
+                  "Suggest a unique and catchy Instagram channel name about '{topic}'.",
+                  keywords_hint="Include these keywords: {keywords}.", candidates=True, budget=20, cache_ttl=3600, length="short"),
+    GeneratorSpec("instagram_video_ideas", "/instagram/generate-video-ideas", InstagramVideoIdeaRequest, InstagramVideoIdeaResponse,
+                  "video_ideas", "Instagram video ideas",
+                  "Suggest several creative and engaging video ideas for Instagram about '{topic}'.",
+                  keywords_hint="Consider these keywords: {keywords}.", candidates=True, budget=45, cache_ttl=1800, revalidate=True),
+    GeneratorSpec("instagram_niche", "/instagram/suggest-niche", InstagramNicheSuggestionRequest, InstagramNicheSuggestionResponse,
+                  "niche_suggestions", "Instagram niche suggestions",
+                  "Based on the following interests: {interests}, suggest several specific Instagram channel niches "
+                  "that could be successful, along with reasons why.",
+                  persona="niche_expert", required=(("interests", "Interests are required."),),
+                  budget=45, cache_ttl=1800, revalidate=True),
+    GeneratorSpec("instagram_reel_ideas", "/instagram/generate-reel-ideas", InstagramReelIdeaRequest, InstagramReelIdeaResponse,
+                  "reel_ideas", "Instagram reel ideas",
+                  "Suggest several creative and engaging video reel ideas for Instagram about '{topic}'. "
+                  "Focus on short, attention-grabbing concepts.",
+                  keywords_hint="Consider these keywords: {keywords}.", candidates=True, budget=45, cache_ttl=1800),
+    GeneratorSpec("instagram_video_script", "/instagram/generate-video-script", InstagramVideoScriptRequest, InstagramVideoScriptResponse,
+                  "script", "Instagram video script",
+                  "Generate a video script about '{topic}' in a '{style}' style. Make it concise and suitable for a short video.",
+                  persona="instagram_script_writer", stream=True, budget=90, cache_ttl=6 * 3600, length="long"),
+    # Email
+    GeneratorSpec("email", "/email/generate-email", EmailRequest, EmailResponse, "email_content", "email content",
+                  "Generate an email about '{topic}' in a '{style}' style.",
+                  keywords_hint="Include these keywords: {keywords}.", budget=60, cache_ttl=6 * 3600, length="long"),
+    # Content pack: a script, post, tweet, Instagram caption and email in one upstream call.
+    GeneratorSpec("content_pack", "/content-pack", ContentPackRequest, ContentPackResponse, None, "content pack",
+                  content_pack_prompt, keywords_hint="Include these keywords: {keywords}.", persona="content_creator",
+                  schema=content_pack_schema, parse=content_pack_result,
+                  required=(("topic", "Topic is required."), ("artifacts", "At least one artifact is required.")),
+                  budget=120, cache_ttl=6 * 3600, priority="standard"),
+]
@@ -0,0 +1,42 @@
+import hashlib
+import os
+
+from fastapi import APIRouter, Request
+
+from utils.helpers import current_user
+
+# Callers identify themselves with this header; anyone without a recognized key is keyed by client address.
+API_KEY_HEADER = "X-API-Key"
+# Comma-separated client API keys the server recognizes. Unknown keys are ignored, so rotating
+# made-up values cannot buy a caller extra fair-scheduling shares.
+CLIENT_API_KEYS = [key.strip() for key in os.getenv("CLIENT_API_KEYS", "").split(",") if key.strip()]
+
+router = APIRouter()
+
+
+def key_id(api_key: str) -> str:
+    """API keys are hashed so they never show up in metrics or logs."""
+    return "key:" + hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+
+def address_id(host: str) -> str:
+    """Client addresses are hashed too: user ids are listed per user in /metrics."""
+    return "ip:" + hashlib.sha256(host.encode()).hexdigest()[:16]
+
+
+KNOWN_KEY_IDS = {key_id(key) for key in CLIENT_API_KEYS}
+
+
+def user_id_for(request: Request) -> str:
+    """Stable identity of the API user behind a request, used for per-user fair scheduling."""
+    api_key = request.headers.get(API_KEY_HEADER)
+    if api_key and key_id(api_key) in KNOWN_KEY_IDS:
+        return key_id(api_key)
+    host = request.client.host if request.client else "unknown"
+    return address_id(host)
+
+
+@router.get("/users/me")
+async def get_current_user():
+    """API endpoint returning the identity the server schedules this caller's requests under."""
+    return {"user": current_user.get()}
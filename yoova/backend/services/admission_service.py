@@ -0,0 +1,94 @@
+import math
+import threading
+from typing import Optional
+
+from fastapi import HTTPException
+
+from services.metrics_service import LatencyTracker
+from services.scheduler_service import PRIORITY_CLASSES, PriorityScheduler
+from utils.helpers import current_deadline
+
+
+class AdmissionController:
+    """Turns away new generations up front when they would wait too long for a slot.
+
+    The wait is estimated from the backlog ahead of the request and the endpoint's recent
+    median upstream latency. The backlog counts the scheduler's waiters and generations
+    admitted but not yet at the scheduler, so a burst cannot all be let in at once;
+    callers report with `arrived` once a generation asks for its slot or gives up. Beyond `max_wait` seconds, or `max_queued`
+    waiting generations, the request gets an immediate 503 whose Retry-After is the time
+    the backlog needs to drain back under the limit. Both limits may be changed at runtime.
+    """
+
+    def __init__(self, scheduler: PriorityScheduler, latency: LatencyTracker, max_wait: float = 20,
+                 max_queued: int = 1000, default_latency: float = 5.0):
+        self.scheduler = scheduler
+        self.latency = latency
+        self.max_wait = max_wait
+        self.max_queued = max_queued
+        self.default_latency = default_latency
+        self.admitted = 0
+        self.rejected = 0
+        self.last_estimate = 0.0
+        self._on_the_way = {name: 0 for name in PRIORITY_CLASSES}
+        self._lock = threading.Lock()
+
+    def configure(self, max_wait: Optional[float] = None, max_queued: Optional[int] = None) -> None:
+        with self._lock:
+            if max_wait is not None:
+                self.max_wait = max_wait
+            if max_queued is not None:
+                self.max_queued = max_queued
+
+    def queued_ahead(self, priority: str) -> int:
+        """Generations a new `priority` one would queue behind, waiting for a slot or on their way to one."""
+        urgent = PRIORITY_CLASSES[:PRIORITY_CLASSES.index(priority) + 1]
+        return self.scheduler.waiting_ahead(priority) + sum(self._on_the_way[name] for name in urgent)
+
+    def estimated_wait(self, endpoint: str, priority: str) -> float:
+        """Seconds until a new `priority` generation for `endpoint` would get a slot."""
+        ahead = self.queued_ahead(priority) + self.scheduler.in_use - self.scheduler.slots + 1
+        return max(0, ahead) / self.scheduler.slots * self._typical_latency(endpoint)
+
+    def _typical_latency(self, endpoint: str) -> float:
+        return self.latency.percentile(endpoint, 50) or self.default_latency
+
+    def admit(self, endpoint: str, priority: str) -> None:
+        """Raises a 503 (or a 504 past the request's deadline) unless the generation may queue."""
+        with self._lock:
+            wait = self.estimated_wait(endpoint, priority)
+            queued = self.queued_ahead(priority)
+            self.last_estimate = wait
+            if wait <= self.max_wait and queued < self.max_queued:
+                deadline = current_deadline.get()
+                if deadline is None or wait < deadline.remaining():
+                    self.admitted += 1
+                    self._on_the_way[priority] += 1
+                    return
+                self.rejected += 1
+                raise deadline.exceeded(f"the estimated {wait:.1f}s wait for a generation slot would not leave time to generate")
+            self.rejected += 1
+            # Time for the backlog to drain back under whichever limit it exceeds.
+            excess = max(wait - self.max_wait,
+                         (queued - self.max_queued + 1) / self.scheduler.slots * self._typical_latency(endpoint))
+        raise HTTPException(
+            status_code=503,
+            detail="Server is overloaded, please retry later.",
+            headers={"Retry-After": str(max(1, math.ceil(excess)))},
+        )
+
+    def arrived(self, priority: str) -> None:
+        """An admitted `priority` generation asked the scheduler for its slot, or ended before it did."""
+        with self._lock:
+            self._on_the_way[priority] -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_wait_seconds": self.max_wait,
+                "max_queued": self.max_queued,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "on_the_way": sum(self._on_the_way.values()),
+                "last_estimated_wait_seconds": round(self.last_estimate, 3),
+            }
@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from models.db_model import ResponseCacheStore
+from utils.helpers import size_of
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """Bounded in-process LRU cache with per-entry TTLs and a byte budget.
+
+    Entries are evicted least-recently-used first whenever the stored values exceed
+    `max_bytes`; expired entries are dropped when they are looked up.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries: "OrderedDict[str, tuple[Any, float, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters: dict = {}
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str, label: str = "default") -> Optional[Any]:
+        """Returns the cached value, or None on a miss or an expired entry."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            counters = self._counters.setdefault(label, {"hits": 0, "misses": 0})
+            if entry is None:
+                counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            counters["hits"] += 1
+            return entry[0]
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        """Stores a value for `ttl` seconds, evicting older entries to stay in budget."""
+        size = size_of(value)
+        if ttl <= 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic() + ttl, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def _remove(self, key: str) -> None:
+        _, _, size = self._entries.pop(key)
+        self.bytes -= size
+
+    def stats(self) -> dict:
+        """Hit/miss counters overall and per label, plus occupancy."""
+        with self._lock:
+            hits = sum(c["hits"] for c in self._counters.values())
+            misses = sum(c["misses"] for c in self._counters.values())
+            return {
+                "hits": hits,
+                "misses": misses,
+                "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "by_endpoint": {label: dict(c) for label, c in self._counters.items()},
+            }
+
+
+class TieredCache:
+    """Small in-process front tier over the persistent SQLite store.
+
+    Lookups try the front LRU first, then the shared table; store hits are promoted to
+    the front for at most `front_ttl` seconds so other workers' refreshes show up soon.
+    A store error (e.g. "database is locked") never fails the request: a failed read is a
+    miss and a failed write is skipped.
+    """
+
+    def __init__(self, front: ResponseCache, store: ResponseCacheStore, front_ttl: float = 300):
+        self.front = front
+        self.store = store
+        self.front_ttl = front_ttl
+        self.store_errors = 0
+
+    async def _read(self, key: str, *args) -> Optional[Tuple[Any, float]]:
+        try:
+            return await run_in_threadpool(self.store.get, key, *args)
+        except sqlite3.Error:
+            self.store_errors += 1
+            logger.exception("Response cache read failed; treating it as a miss")
+            return None
+
+    async def get(self, key: str, label: str = "default") -> Optional[Any]:
+        value = self.front.get(key, label=label)
+        if value is not None:
+            return value
+        row = await self._read(key)
+        if row is None:
+            return None
+        value, expires_at = row
+        self.front.set(key, value, min(self.front_ttl, expires_at - time.time()))
+        return value
+
+    async def get_stale(self, key: str, stale_for: float, label: str = "default") -> Optional[Tuple[Any, bool]]:
+        """Like `get`, but also accepts a stored value that expired less than `stale_for` seconds ago.
+
+        Returns (value, is_stale). Stale values are not promoted to the front tier.
+        """
+        value = self.front.get(key, label=label)
+        if value is not None:
+            return value, False
+        row = await self._read(key, stale_for)
+        if row is None:
+            return None
+        value, expires_at = row
+        stale = expires_at <= time.time()
+        if not stale:
+            self.front.set(key, value, min(self.front_ttl, expires_at - time.time()))
+        return value, stale
+
+    async def set(self, key: str, value: Any, ttl: float, label: str = "default") -> None:
+        self.front.set(key, value, min(self.front_ttl, ttl))
+        try:
+            await run_in_threadpool(self.store.set, key, label, value, ttl)
+        except sqlite3.Error:
+            self.store_errors += 1
+            logger.exception("Response cache write failed; the value is only cached in this process")
+
+    async def stats(self) -> dict:
+        return {"front": self.front.stats(), "store": await run_in_threadpool(self.store.stats), "store_errors": self.store_errors}
+
+
+class Revalidator:
+    """Runs stale-while-revalidate refreshes in the background, at most one per key at a time."""
+
+    def __init__(self):
+        self.started = 0
+        self.coalesced = 0
+        self.failed = 0
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def refresh(self, key: str, regenerate: Callable[[], Awaitable[Any]]) -> None:
+        """Starts `regenerate` for `key` unless a refresh of it is already running."""
+        if key in self._tasks:
+            self.coalesced += 1
+            return
+        self.started += 1
+        self._tasks[key] = asyncio.create_task(self._run(key, regenerate))
+
+    async def _run(self, key: str, regenerate: Callable[[], Awaitable[Any]]) -> None:
+        try:
+            await regenerate()
+        except Exception:
+            # The stale value keeps being served; the next request past expiry tries again.
+            self.failed += 1
+        finally:
+            del self._tasks[key]
+
+    def stats(self) -> dict:
+        return {"started": self.started, "coalesced": self.coalesced, "failed": self.failed, "in_flight": len(self._tasks)}
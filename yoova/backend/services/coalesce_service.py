@@ -0,0 +1,79 @@
+import asyncio
+import contextvars
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from utils.helpers import Deadline, current_deadline
+
+
+class _Flight:
+    """One in-flight async call, the number of callers still waiting on it and the deadline it runs under."""
+
+    def __init__(self, deadline: Optional[Deadline]):
+        self.task: Optional[asyncio.Task] = None
+        self.waiters = 0
+        self.deadline = None
+        if deadline is not None:
+            # A copy, so widening it for later callers leaves the first caller's own deadline alone.
+            self.deadline = Deadline(deadline.budget)
+            self.deadline.expires_at = deadline.expires_at
+
+    def join(self, deadline: Optional[Deadline]) -> None:
+        self.waiters += 1
+        if self.deadline is not None:
+            self.deadline.widen(deadline)
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key onto one upstream execution.
+
+    Every caller that arrives while a call for its key is running shares that call's
+    result or exception. The shared call runs under the latest deadline of the callers
+    waiting on it, so one caller's tight budget does not fail the others; each caller
+    stops waiting, with a 504, when its own deadline passes.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    async def ado(self, key: str, fn: Callable[..., Awaitable[Any]], *args) -> Any:
+        deadline = current_deadline.get()
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _Flight(deadline)
+            # The call runs as its own task, under the flight's deadline rather than the first
+            # caller's, so one caller going away or running out of time does not fail the others.
+            context = contextvars.copy_context()
+            context.run(current_deadline.set, flight.deadline)
+            flight.task = asyncio.get_running_loop().create_task(fn(*args), context=context)
+            flight.task.add_done_callback(lambda _, flight=flight: self._forget(key, flight))
+            self.executed += 1
+        else:
+            self.coalesced += 1
+        flight.join(deadline)
+        try:
+            if deadline is None:
+                return await asyncio.shield(flight.task)
+            try:
+                return await asyncio.wait_for(asyncio.shield(flight.task), timeout=max(0.0, deadline.remaining()))
+            except asyncio.TimeoutError:
+                raise deadline.exceeded("the shared upstream call did not finish in time")
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Nobody is left to receive the result. Callers arriving from now on start a
+                # new flight rather than join one that is being cancelled.
+                self._forget(key, flight)
+                flight.task.cancel()
+
+    def _forget(self, key: str, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def stats(self) -> dict:
+        return {
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._flights),
+        }
@@ -0,0 +1,124 @@
+import asyncio
+import re
+import time
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+from services.coalesce_service import SingleFlight
+from services.limiter_service import estimate_tokens
+from utils.helpers import stable_key
+
+
+class ContextCache:
+    """Registers long static prompt prefixes with Gemini's cachedContents API and references them by handle.
+
+    A generateContent payload whose systemInstruction is estimated at `min_tokens` or more is
+    sent with a `cachedContent` handle instead, so the prefix is not re-sent or re-processed
+    on every call. Gemini scopes cached content to a model and API key, so handles are too.
+    Handles live for `ttl` seconds and are extended in the background once less than
+    `refresh_before` seconds remain. A prefix that could not be cached is sent inline, and
+    caching it is retried after `retry_after` seconds.
+    """
+
+    def __init__(self, ttl: float = 3600, refresh_before: float = 300, min_tokens: int = 4096,
+                 retry_after: float = 300, timeout: float = 10):
+        self.ttl = ttl
+        self.refresh_before = refresh_before
+        self.min_tokens = min_tokens
+        self.retry_after = retry_after
+        self.timeout = timeout
+        self.hits = 0
+        self.created = 0
+        self.refreshed = 0
+        self.failed = 0
+        self.invalidated = 0
+        self.saved_tokens = 0
+        self._entries: Dict[str, Tuple[str, float]] = {}  # key -> (handle, expires at)
+        self._failed_until: Dict[str, float] = {}
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self._flights = SingleFlight()
+
+    async def apply(self, client: httpx.AsyncClient, payload: dict, url: str, api_key: Optional[str]) -> Tuple[dict, Optional[str]]:
+        """`payload` with its systemInstruction swapped for a cache handle where worthwhile, and the cache key used."""
+        instruction = payload.get("systemInstruction")
+        if instruction is None:
+            return payload, None
+        prefix_tokens = estimate_tokens({"contents": [instruction]}, default_output_tokens=0)
+        if prefix_tokens < self.min_tokens:
+            return payload, None
+        model = re.search(r"/models/([^/:]+):", url).group(1)
+        key = stable_key("cached-content", {"model": model, "api_key": api_key or "", "instruction": instruction})
+        now = time.monotonic()
+        if self._failed_until.get(key, 0.0) > now:
+            return payload, None
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= now:
+            try:
+                entry = await self._flights.ado(key, self._create, client, key, url, model, instruction, api_key)
+            except (httpx.HTTPError, KeyError, ValueError):
+                self.failed += 1
+                self._failed_until[key] = time.monotonic() + self.retry_after
+                return payload, None
+        elif entry[1] - now < self.refresh_before and key not in self._refreshing:
+            self._refreshing[key] = asyncio.create_task(self._refresh(client, key, url, entry[0], api_key))
+        self.hits += 1
+        self.saved_tokens += prefix_tokens
+        stripped = {name: value for name, value in payload.items() if name != "systemInstruction"}
+        return {**stripped, "cachedContent": entry[0]}, key
+
+    def invalidate(self, key: str) -> None:
+        """Forgets a handle Gemini no longer recognizes; the next call creates a new one."""
+        if self._entries.pop(key, None) is not None:
+            self.invalidated += 1
+
+    async def _create(self, client: httpx.AsyncClient, key: str, url: str, model: str, instruction: dict,
+                      api_key: Optional[str]) -> Tuple[str, float]:
+        response = await client.post(
+            f"{url.split('/models/')[0]}/cachedContents",
+            json={"model": f"models/{model}", "systemInstruction": instruction, "ttl": f"{int(self.ttl)}s"},
+            headers=self._headers(api_key), timeout=self.timeout,
+        )
+        response.raise_for_status()
+        entry = (response.json()["name"], time.monotonic() + self.ttl)
+        self._entries[key] = entry
+        self._failed_until.pop(key, None)
+        self.created += 1
+        return entry
+
+    async def _refresh(self, client: httpx.AsyncClient, key: str, url: str, handle: str, api_key: Optional[str]) -> None:
+        """Extends a handle's TTL before it expires, so callers never wait for a new one."""
+        try:
+            response = await client.patch(
+                f"{url.split('/models/')[0]}/{handle}", params={"updateMask": "ttl"},
+                json={"ttl": f"{int(self.ttl)}s"}, headers=self._headers(api_key), timeout=self.timeout,
+            )
+        except httpx.HTTPError:
+            self.failed += 1
+            return
+        finally:
+            del self._refreshing[key]
+        if response.status_code == 200:
+            self._entries[key] = (handle, time.monotonic() + self.ttl)
+            self.refreshed += 1
+        elif response.status_code in (403, 404):
+            # Gone upstream: create a fresh one on the next call.
+            self.invalidate(key)
+        else:
+            self.failed += 1
+
+    @staticmethod
+    def _headers(api_key: Optional[str]) -> Optional[dict]:
+        return {"x-goog-api-key": api_key} if api_key else None
+
+    def stats(self) -> dict:
+        return {
+            "handles": len(self._entries),
+            "hits": self.hits,
+            "created": self.created,
+            "refreshed": self.refreshed,
+            "failed": self.failed,
+            "invalidated": self.invalidated,
+            "estimated_prefix_tokens_saved": self.saved_tokens,
+            "min_tokens": self.min_tokens,
+        }
@@ -0,0 +1,117 @@
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, Optional, Tuple
+
+from services.limiter_service import RateLimiter
+from services.resilience_service import CircuitBreaker
+
+# Each level keeps the measures of the ones before it.
+DEGRADATION_LEVELS = ("normal", "stale-cache", "short-output", "fast-model")
+
+
+class DegradationController:
+    """Trades output quality for speed while Gemini is struggling, one step at a time.
+
+    Every `interval` seconds the recent generations (latency and failures), the rate
+    limiter's backoff and the circuit breaker decide whether conditions are bad, in which
+    case the level goes one step down, or have been good for `recovery_period` seconds, in
+    which case it goes one step back up. The levels, in order:
+
+    stale-cache   serve recently generated results for the same inputs, even expired or `fresh` ones
+    short-output  cap maxOutputTokens for long-form endpoints
+    fast-model    send cheap endpoints to a faster model variant
+    """
+
+    def __init__(self, breaker: CircuitBreaker, limiter: RateLimiter, long_form: Iterable[str] = (),
+                 cheap: Iterable[str] = (), max_output_tokens: int = 1024, fast_model: str = "gemini-1.5-flash-8b",
+                 window: float = 60, interval: float = 10, recovery_period: float = 30,
+                 error_threshold: float = 0.2, latency_threshold: float = 20, min_samples: int = 5):
+        self.breaker = breaker
+        self.limiter = limiter
+        self.long_form = set(long_form)
+        self.cheap = set(cheap)
+        self.max_output_tokens = max_output_tokens
+        self.fast_model = fast_model
+        self.window = window
+        self.interval = interval
+        self.recovery_period = recovery_period
+        self.error_threshold = error_threshold
+        self.latency_threshold = latency_threshold
+        self.min_samples = min_samples
+        self.current = 0
+        self.steps_down = 0
+        self.steps_up = 0
+        self._samples: Deque[Tuple[float, float, bool]] = deque()
+        self._evaluated_at = 0.0
+        self._healthy_since: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, ok: bool) -> None:
+        """Records one finished generation; `ok` is False for upstream failures and timeouts."""
+        with self._lock:
+            self._samples.append((time.monotonic(), seconds, ok))
+
+    def level(self) -> int:
+        """Current level, re-evaluated at most once per `interval`."""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._evaluated_at >= self.interval:
+                self._evaluated_at = now
+                self._evaluate(now)
+            return self.current
+
+    def overrides(self, endpoint: str, level: int) -> Dict[str, object]:
+        """Upstream request changes for a generation through `endpoint` at `level`."""
+        overrides: Dict[str, object] = {}
+        if level >= DEGRADATION_LEVELS.index("short-output") and endpoint in self.long_form:
+            overrides["max_output_tokens"] = self.max_output_tokens
+        if level >= DEGRADATION_LEVELS.index("fast-model") and endpoint in self.cheap:
+            overrides["model"] = self.fast_model
+        return overrides
+
+    def _signals(self, now: float) -> Tuple[float, Optional[float]]:
+        while self._samples and self._samples[0][0] < now - self.window:
+            self._samples.popleft()
+        if len(self._samples) < self.min_samples:
+            return 0.0, None
+        error_rate = sum(1 for _, _, ok in self._samples if not ok) / len(self._samples)
+        latencies = sorted(seconds for _, seconds, ok in self._samples if ok)
+        p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] if latencies else None
+        return error_rate, p95
+
+    def _evaluate(self, now: float) -> None:
+        error_rate, p95 = self._signals(now)
+        throttled = self.limiter.stats()["rate_scale"]
+        breaker_open = self.breaker.stats()["state"] != "closed"
+        bad = (breaker_open or throttled < 0.5 or error_rate >= self.error_threshold
+               or (p95 is not None and p95 >= self.latency_threshold))
+        # Recovery needs clear margins, so the level does not flap around a threshold.
+        good = (not breaker_open and throttled >= 0.9 and error_rate < self.error_threshold / 2
+                and (p95 is None or p95 < 0.7 * self.latency_threshold))
+        if bad:
+            self._healthy_since = None
+            if self.current < len(DEGRADATION_LEVELS) - 1:
+                self.current += 1
+                self.steps_down += 1
+        elif good and self.current:
+            if self._healthy_since is None:
+                self._healthy_since = now
+            elif now - self._healthy_since >= self.recovery_period:
+                self.current -= 1
+                self.steps_up += 1
+                self._healthy_since = now
+        else:
+            self._healthy_since = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            error_rate, p95 = self._signals(time.monotonic())
+            return {
+                "level": DEGRADATION_LEVELS[self.current],
+                "steps_down": self.steps_down,
+                "steps_up": self.steps_up,
+                "recent_samples": len(self._samples),
+                "recent_error_rate": round(error_rate, 4),
+                "recent_p95_seconds": round(p95, 4) if p95 is not None else None,
+            }
@@ -0,0 +1,79 @@
+import asyncio
+from typing import Dict, Iterable
+
+
+class DisconnectCounter:
+    """Requests cancelled because their client disconnected, per endpoint."""
+
+    def __init__(self):
+        self.cancelled: Dict[str, int] = {}
+
+    def record(self, path: str) -> None:
+        self.cancelled[path] = self.cancelled.get(path, 0) + 1
+
+    def stats(self) -> dict:
+        return {"requests_cancelled": sum(self.cancelled.values()), "by_endpoint": dict(self.cancelled)}
+
+
+class DisconnectCanceller:
+    """ASGI middleware that cancels the handling of a request as soon as its client goes away.
+
+    The request body is read up front; from then on this middleware is the only reader of
+    the connection, and downstream code sees the disconnect when it happens. Cancelling the
+    handler unwinds every wait and upstream call it made, so abandoned requests stop
+    spending quota. Only `paths` are watched; cancellations are counted on `counter`.
+    """
+
+    def __init__(self, app, paths: Iterable[str], counter: DisconnectCounter):
+        self.app = app
+        self.paths = set(paths)
+        self.counter = counter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        buffered = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            buffered.append(message)
+            if not message.get("more_body"):
+                break
+
+        disconnected = asyncio.Event()
+        response_complete = False
+
+        async def replay():
+            if buffered:
+                return buffered.pop(0)
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def track(message):
+            nonlocal response_complete
+            if message["type"] == "http.response.body" and not message.get("more_body"):
+                response_complete = True
+            await send(message)
+
+        handler = asyncio.create_task(self.app(scope, replay, track))
+
+        async def watch():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            disconnected.set()
+            if not response_complete and not handler.done():
+                self.counter.record(scope["path"])
+                handler.cancel()
+
+        watcher = asyncio.create_task(watch())
+        try:
+            await handler
+        except asyncio.CancelledError:
+            if not disconnected.is_set():
+                # Cancelled from outside (e.g. shutdown), not by the watcher.
+                handler.cancel()
+                raise
+        finally:
+            watcher.cancel()
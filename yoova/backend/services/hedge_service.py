@@ -0,0 +1,88 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable
+
+from services.metrics_service import LatencyTracker
+from utils.helpers import current_deadline
+
+
+class Hedger:
+    """Sends a duplicate upstream request when the first one is slower than usual.
+
+    If a call has not finished within the endpoint's `percentile` latency (from the shared
+    LatencyTracker), one hedge is fired and whichever finishes first wins; the other is
+    cancelled. Hedges are capped at `budget` (a fraction) of all calls, and no hedging
+    happens until an endpoint has `min_samples` latencies to estimate from.
+    """
+
+    def __init__(self, latency: LatencyTracker, percentile: float = 95, budget: float = 0.05,
+                 min_samples: int = 20, enabled: bool = True):
+        self.latency = latency
+        self.percentile = percentile
+        self.budget = budget
+        self.min_samples = min_samples
+        self.enabled = enabled
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.over_budget = 0
+        self._lock = threading.Lock()
+
+    def hedge_delay(self, key: str):
+        if not self.enabled or self.latency.count(key) < self.min_samples:
+            return None
+        delay = self.latency.percentile(key, self.percentile)
+        deadline = current_deadline.get()
+        if deadline is not None and deadline.remaining() <= delay:
+            # A hedge fired that late could not finish within the request's deadline.
+            return None
+        return delay
+
+    def _take_budget(self) -> bool:
+        with self._lock:
+            if self.hedged + 1 > self.budget * self.calls:
+                self.over_budget += 1
+                return False
+            self.hedged += 1
+            return True
+
+    async def run(self, key: str, make_call: Callable[[], Awaitable[Any]]) -> Any:
+        """Runs `make_call`, hedging it once if it exceeds the endpoint's hedge delay."""
+        with self._lock:
+            self.calls += 1
+        delay = self.hedge_delay(key)
+        primary = asyncio.ensure_future(make_call())
+        if delay is None:
+            return await primary
+        hedge = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done or not self._take_budget():
+                return await primary
+            hedge = asyncio.ensure_future(make_call())
+            pending = {primary, hedge}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    # A failed attempt only loses if the other one can still succeed.
+                    if task.exception() is None or not pending:
+                        if task is hedge and task.exception() is None:
+                            with self._lock:
+                                self.hedge_wins += 1
+                        return task.result()
+        finally:
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "percentile": self.percentile,
+                "budget": self.budget,
+                "calls": self.calls,
+                "hedged": self.hedged,
+                "hedge_wins": self.hedge_wins,
+                "over_budget": self.over_budget,
+            }
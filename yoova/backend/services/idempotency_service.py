@@ -0,0 +1,81 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from services.cache_service import ResponseCache
+
+# A captured response: {"status": int, "headers": {...}, "body": str, "fingerprint": str}.
+StoredResponse = Dict[str, Any]
+
+
+class IdempotencyConflict(Exception):
+    """The Idempotency-Key was already used with a different request body."""
+
+
+class IdempotencyStore:
+    """Makes retried requests with the same Idempotency-Key run at most once.
+
+    A retry that arrives while the original is still running waits for it and gets the
+    same response; one that arrives later gets the stored response for `ttl` seconds.
+    Completed responses live in a bounded LRU; server errors are not stored, so those
+    can be retried for real. If the original is cancelled or crashes, a waiting retry
+    runs the request itself.
+    """
+
+    def __init__(self, ttl: float = 3600, max_bytes: int = 16 * 1024 * 1024):
+        self.ttl = ttl
+        self.completed = ResponseCache(max_bytes=max_bytes)
+        self.executed = 0
+        self.replayed = 0
+        self.attached = 0
+        self.conflicts = 0
+        self._in_flight: Dict[str, Tuple[str, asyncio.Future]] = {}
+
+    async def run(self, key: str, fingerprint: str,
+                  execute: Callable[[], Awaitable[StoredResponse]]) -> Tuple[StoredResponse, bool]:
+        """Returns the response for `key` and whether it was replayed rather than executed now."""
+        while True:
+            stored = self.completed.get(key, label="idempotency")
+            if stored is not None:
+                self._check(stored["fingerprint"], fingerprint)
+                self.replayed += 1
+                return stored, True
+            flight = self._in_flight.get(key)
+            if flight is None:
+                break
+            self._check(flight[0], fingerprint)
+            self.attached += 1
+            # Shielded so a disconnecting retry does not cancel the original.
+            stored = await asyncio.shield(flight[1])
+            if stored is not None:
+                return stored, True
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = (fingerprint, future)
+        stored: Optional[StoredResponse] = None
+        try:
+            stored = {**await execute(), "fingerprint": fingerprint}
+            self.executed += 1
+            if stored["status"] < 500:
+                self.completed.set(key, stored, self.ttl)
+            return stored, False
+        finally:
+            del self._in_flight[key]
+            future.set_result(stored)
+
+    def _check(self, expected: str, fingerprint: str) -> None:
+        if expected != fingerprint:
+            self.conflicts += 1
+            raise IdempotencyConflict()
+
+    def stats(self) -> dict:
+        front = self.completed.stats()
+        return {
+            "executed": self.executed,
+            "replayed": self.replayed,
+            "attached": self.attached,
+            "conflicts": self.conflicts,
+            "in_flight": len(self._in_flight),
+            "stored": front["entries"],
+            "bytes": front["bytes"],
+            "max_bytes": front["max_bytes"],
+        }
@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from starlette.concurrency import run_in_threadpool
+
+from models.db_model import JobStore
+
+# Runs one stored job and returns {"status": code, "result" | "error": ...}.
+JobRunner = Callable[[dict], Awaitable[Dict[str, Any]]]
+
+FINISHED_STATUSES = {"succeeded", "failed"}
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueue:
+    """Background worker pool for generations that outlive an HTTP request.
+
+    Jobs are written to the store before they are queued and claimed before they run, so
+    a restart loses nothing: `start` resumes every queued job, and jobs a worker was
+    running at shutdown are put back in the queue. Watchers are woken on every change.
+    A worker that fails to read or write the store logs it and moves on to the next job;
+    the job is left as stored and runs again when it is next resumed.
+    """
+
+    def __init__(self, store: JobStore, run: JobRunner, workers: int = 4, stale_after: float = 300):
+        self.store = store
+        self.run = run
+        self.workers = workers
+        self.stale_after = stale_after
+        self.completed = 0
+        self.failed = 0
+        self.resumed = 0
+        self.store_errors = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._running: Set[str] = set()
+        self._changed: Optional[asyncio.Condition] = None
+
+    async def start(self) -> None:
+        """Starts the workers and resumes the jobs left over from a previous run."""
+        self._queue = asyncio.Queue()
+        self._changed = asyncio.Condition()
+        for job_id in await run_in_threadpool(self.store.pending, self.stale_after):
+            self._queue.put_nowait(job_id)
+            self.resumed += 1
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Jobs cut off mid-generation run again on the next boot.
+        for job_id in list(self._running):
+            await run_in_threadpool(self.store.requeue, job_id)
+        self._running.clear()
+
+    async def submit(self, generator: str, params: dict, priority: str = "standard", user_id: str = "anonymous") -> dict:
+        """Stores a new job, queues it and returns its record."""
+        job_id = uuid.uuid4().hex
+        await run_in_threadpool(self.store.create, job_id, generator, params, priority, user_id)
+        self._queue.put_nowait(job_id)
+        return await self.get(job_id)
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return await run_in_threadpool(self.store.get, job_id)
+
+    async def wait_for_change(self, timeout: float) -> None:
+        """Returns when any job changes state in this process, or after `timeout` seconds.
+
+        Jobs run by another worker process are only seen by re-reading the store, so
+        watchers should poll at least every `timeout` seconds.
+        """
+        async with self._changed:
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _notify(self) -> None:
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def _work(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                if not await run_in_threadpool(self.store.claim, job_id):
+                    continue
+                self._running.add(job_id)
+                await self._notify()
+                # Each job runs in its own task so per-request context (deadline, endpoint)
+                # does not carry over from the previous job on this worker.
+                outcome = await asyncio.create_task(self._execute(job_id))
+                await run_in_threadpool(self.store.finish, job_id, outcome["status"], outcome.get("result"), outcome.get("error"))
+                self._running.discard(job_id)
+                if outcome["status"] == 200:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                await self._notify()
+            except Exception:
+                # e.g. "database is locked": keep the worker alive rather than shrink the pool.
+                self.store_errors += 1
+                logger.exception("Job %s could not be claimed or finished", job_id)
+                self._running.discard(job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _execute(self, job_id: str) -> Dict[str, Any]:
+        job = await run_in_threadpool(self.store.get, job_id)
+        try:
+            return await self.run(job)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return {"status": 500, "error": f"An unexpected error occurred: {e}"}
+
+    async def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "running": len(self._running),
+            "completed": self.completed,
+            "failed": self.failed,
+            "resumed": self.resumed,
+            "store_errors": self.store_errors,
+            **await run_in_threadpool(self.store.stats),
+        }
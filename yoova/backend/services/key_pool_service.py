@@ -0,0 +1,105 @@
+import math
+import threading
+import time
+from typing import List, Optional
+
+from fastapi import HTTPException
+
+from services.limiter_service import TokenBucket
+
+
+class ApiKey:
+    """One Gemini API key with its own RPM/TPM budget and rotation state."""
+
+    def __init__(self, name: str, key: str, rpm: float, tpm: float):
+        self.name = name
+        self.key = key
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.cooldown_until = 0.0
+        self.used_requests = 0
+        self.used_tokens = 0
+        self.throttled = 0
+        self.forbidden = 0
+
+    def headroom(self, now: float) -> float:
+        """Fraction of the key's burst budget left, by whichever of RPM and TPM is tighter."""
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        return min(self.requests.level / self.requests.capacity, self.tokens.level / self.tokens.capacity)
+
+
+class KeyPool:
+    """Routes each upstream call to the API key with the most RPM/TPM headroom.
+
+    A key answered with 429 sits out the upstream retry delay, or `cooldown` seconds without
+    one; a key answered with 403 sits out `forbidden_cooldown` seconds. The last key still in
+    rotation is never benched, so a single-key pool keeps serving and the rate limiter's backoff
+    handles its 429s instead.
+    """
+
+    def __init__(self, keys: List[str], rpm: float, tpm: float, cooldown: float = 60, forbidden_cooldown: float = 600):
+        self.keys = [ApiKey(f"key{index}:...{key[-4:]}", key, rpm, tpm) for index, key in enumerate(keys)]
+        self.cooldown = cooldown
+        self.forbidden_cooldown = forbidden_cooldown
+        self._lock = threading.Lock()
+
+    def available(self) -> int:
+        now = time.monotonic()
+        with self._lock:
+            return sum(1 for key in self.keys if key.cooldown_until <= now)
+
+    def acquire(self, tokens: int) -> ApiKey:
+        """Picks the key for one request with `tokens` estimated tokens and charges it."""
+        with self._lock:
+            now = time.monotonic()
+            ready = [key for key in self.keys if key.cooldown_until <= now]
+            if not ready:
+                retry_after = min(key.cooldown_until for key in self.keys) - now
+                raise HTTPException(
+                    status_code=503,
+                    detail="Every Gemini API key is cooling down, please retry later.",
+                    headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+                )
+            key = max(ready, key=lambda candidate: candidate.headroom(now))
+            key.requests.reserve(1)
+            key.tokens.reserve(tokens)
+            key.used_requests += 1
+            key.used_tokens += tokens
+            return key
+
+    def penalize(self, key: ApiKey, status_code: int, retry_after: Optional[float] = None) -> bool:
+        """Takes a key out of rotation after a 429 (quota) or 403 (key rejected).
+
+        Returns False, leaving the key in rotation, when no other key could take its requests.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if status_code == 403:
+                key.forbidden += 1
+                pause = self.forbidden_cooldown
+            else:
+                key.throttled += 1
+                pause = retry_after if retry_after is not None else self.cooldown
+            if not any(other.cooldown_until <= now for other in self.keys if other is not key):
+                return False
+            key.cooldown_until = max(key.cooldown_until, now + pause)
+            return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            return {
+                "available": sum(1 for key in self.keys if key.cooldown_until <= now),
+                "keys": {
+                    key.name: {
+                        "requests": key.used_requests,
+                        "estimated_tokens": key.used_tokens,
+                        "saturation": round(1 - max(0.0, key.headroom(now)), 3),
+                        "throttled": key.throttled,
+                        "forbidden": key.forbidden,
+                        "cooling_down_for_seconds": round(max(0.0, key.cooldown_until - now), 3),
+                    }
+                    for key in self.keys
+                },
+            }
@@ -0,0 +1,152 @@
+import asyncio
+import math
+import threading
+import time
+from typing import Optional
+
+from fastapi import HTTPException
+
+from utils.helpers import current_deadline
+
+
+class TokenBucket:
+    """Token bucket whose level may go negative to queue reservations in arrival order."""
+
+    def __init__(self, per_minute: float, burst_seconds: float = 10):
+        self.per_minute = per_minute
+        self.burst_seconds = burst_seconds
+        self.scale = 1.0
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    @property
+    def rate(self) -> float:
+        """Current refill rate in tokens per second."""
+        return self.per_minute * self.scale / 60
+
+    @property
+    def capacity(self) -> float:
+        return max(1.0, self.per_minute / 60 * self.burst_seconds)
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        """Takes `amount` tokens and returns how many seconds until they are actually available."""
+        self.level -= amount
+        return max(0.0, -self.level / self.rate)
+
+    def refund(self, amount: float) -> None:
+        self.level = min(self.capacity, self.level + amount)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limiter shared by every Gemini call.
+
+    Callers reserve one request and their estimated tokens, then wait their turn instead of
+    firing at the upstream. The queue is bounded in length and in wait time; beyond that
+    callers get a 503 with Retry-After. A 429 from Gemini pauses everyone for its retry
+    delay and halves the rate, which then recovers gradually with each success.
+    """
+
+    def __init__(self, rpm: float, tpm: float, max_queue: int = 500, max_wait: float = 30,
+                 min_scale: float = 0.1, recovery_step: float = 0.02):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.min_scale = min_scale
+        self.recovery_step = recovery_step
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.throttled = 0
+        self.total_wait = 0.0
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens: int) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self.requests.refill(now)
+            self.tokens.refill(now)
+            wait = max(self.requests.reserve(1), self.tokens.reserve(tokens), self._paused_until - now)
+            deadline = current_deadline.get()
+            if deadline is not None and wait >= deadline.remaining():
+                self.requests.refund(1)
+                self.tokens.refund(tokens)
+                self.rejected += 1
+                raise deadline.exceeded(f"waiting {wait:.1f}s for Gemini quota would not leave time to generate")
+            if self.waiting >= self.max_queue or wait > self.max_wait:
+                self.requests.refund(1)
+                self.tokens.refund(tokens)
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=503,
+                    detail="Gemini quota is saturated, please retry later.",
+                    headers={"Retry-After": str(max(1, math.ceil(wait)))},
+                )
+            self.waiting += 1
+            self.admitted += 1
+            self.total_wait += wait
+            return wait
+
+    def _cancel(self, tokens: int) -> None:
+        with self._lock:
+            self.requests.refund(1)
+            self.tokens.refund(tokens)
+
+    def _done_waiting(self) -> None:
+        with self._lock:
+            self.waiting -= 1
+
+    async def aacquire(self, tokens: int) -> None:
+        """Waits on the event loop until a request with `tokens` estimated tokens may be sent."""
+        wait = self._reserve(tokens)
+        try:
+            if wait:
+                await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            self._cancel(tokens)
+            raise
+        finally:
+            self._done_waiting()
+
+    def on_success(self, estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+        """Settles the token estimate against usageMetadata and lets the rate recover."""
+        with self._lock:
+            if actual_tokens is not None:
+                self.tokens.level -= actual_tokens - estimated_tokens
+            scale = min(1.0, self.requests.scale + self.recovery_step)
+            self.requests.scale = self.tokens.scale = scale
+
+    def on_throttled(self, retry_after: float) -> None:
+        """Applies an upstream 429: pause for its retry delay and back the rate off."""
+        with self._lock:
+            self.throttled += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            scale = max(self.min_scale, self.requests.scale / 2)
+            self.requests.scale = self.tokens.scale = scale
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "rpm": self.requests.per_minute,
+                "tpm": self.tokens.per_minute,
+                "rate_scale": round(self.requests.scale, 3),
+                "waiting": self.waiting,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "throttled": self.throttled,
+                "avg_wait_seconds": round(self.total_wait / self.admitted, 3) if self.admitted else 0.0,
+                "paused_for_seconds": round(max(0.0, self._paused_until - time.monotonic()), 3),
+            }
+
+
+def estimate_tokens(payload: dict, default_output_tokens: int = 800) -> int:
+    """Rough pre-flight token estimate (about four characters per token) for the TPM bucket."""
+    contents = [*payload.get("contents", []), *([payload["systemInstruction"]] if "systemInstruction" in payload else [])]
+    characters = sum(len(part.get("text", "")) for content in contents for part in content.get("parts", []))
+    output_tokens = payload.get("generationConfig", {}).get("maxOutputTokens", default_output_tokens)
+    return characters // 4 + output_tokens
@@ -0,0 +1,131 @@
+from typing import Any, AsyncContextManager, AsyncGenerator, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, Type, Union
+
+from pydantic import BaseModel
+
+
+class GeneratorSpec:
+    """Declarative description of one generation endpoint.
+
+    `prompt` is a template filled from the request's fields (or a function of the request),
+    followed by `keywords_hint` when the request has keywords; `persona` names the static
+    system-instruction prefix. `candidates` generators return up to `count` options from one
+    call as `output` plus `candidates`; `schema` generators ask for structured JSON output,
+    turned into the response fields by `parse`. `stream` adds a server-sent events variant at
+    `<route>/stream`.
+
+    Per-endpoint tuning: `budget` (latency budget, seconds), `cache_ttl` (seconds),
+    `priority` (scheduling class), `revalidate` (serve stale while revalidating) and
+    `length` ("short" for cheap outputs, "long" for long-form ones).
+    """
+
+    def __init__(self, name: str, route: str, request_model: Type[BaseModel], response_model: Type[BaseModel],
+                 output: Optional[str], what: str, prompt: Union[str, Callable[[BaseModel], str]],
+                 keywords_hint: Optional[str] = None, persona: Optional[str] = None, candidates: bool = False,
+                 schema: Optional[Callable[[BaseModel], dict]] = None, parse: Optional[Callable[[BaseModel, Any], Any]] = None,
+                 stream: bool = False, required: Sequence[Tuple[str, str]] = (("topic", "Topic is required."),),
+                 budget: Optional[float] = None, cache_ttl: Optional[int] = None, priority: str = "interactive",
+                 revalidate: bool = False, length: Optional[str] = None):
+        self.name = name
+        self.route = route
+        self.request_model = request_model
+        self.response_model = response_model
+        self.output = output
+        self.what = what
+        self.prompt = prompt
+        self.keywords_hint = keywords_hint
+        self.persona = persona
+        self.candidates = candidates
+        self.schema = schema
+        self.parse = parse
+        self.stream = stream
+        self.required = required
+        self.budget = budget
+        self.cache_ttl = cache_ttl
+        self.priority = priority
+        self.revalidate = revalidate
+        self.length = length
+
+    @property
+    def stream_route(self) -> str:
+        return self.route + "/stream"
+
+    @property
+    def paths(self) -> List[str]:
+        """Every path this generator is served on."""
+        return [self.route, self.stream_route] if self.stream else [self.route]
+
+    def missing(self, request: BaseModel) -> Optional[str]:
+        """Error message for the first required field the request leaves empty, if any."""
+        for field, message in self.required:
+            if not getattr(request, field):
+                return message
+        return None
+
+    def render(self, request: BaseModel) -> str:
+        """The request-specific prompt."""
+        prompt = self.prompt(request) if callable(self.prompt) else self.prompt.format(**request.model_dump())
+        keywords = getattr(request, "keywords", None)
+        if keywords and self.keywords_hint:
+            prompt += " " + self.keywords_hint.format(keywords=keywords)
+        return prompt
+
+    def response(self, value: Any) -> BaseModel:
+        """The endpoint's response for a generated value."""
+        if self.candidates:
+            return self.response_model(**{self.output: value[0], "candidates": value})
+        if self.output is None:
+            return self.response_model(**value)
+        return self.response_model(**{self.output: value})
+
+
+class Generation:
+    """One request for a generator on its way through a pipeline; stages share state through it."""
+
+    def __init__(self, spec: GeneratorSpec, request: BaseModel, stream: bool = False):
+        self.spec = spec
+        self.request = request
+        self.stream = stream
+        self.endpoint = spec.stream_route if stream else spec.route
+        self.deadline = None
+        self.priority: Optional[str] = None
+        self.admitted = False  # Admitted and not yet at the scheduler.
+        self.overrides: Dict[str, object] = {}
+
+
+# A middleware stage: gets the generation and the rest of the pipeline, and returns the result.
+Stage = Callable[[Generation, Callable[[], Awaitable[Any]]], Awaitable[Any]]
+
+
+class Pipeline:
+    """Runs every generation through the same chain of middleware stages, outermost first.
+
+    A stage may answer on its own (a cache hit), adjust the generation before calling on,
+    or wrap what the rest of the chain returns. `terminal` makes the upstream call. For a
+    streaming generation the chain returns an async generator of text chunks instead of
+    the finished value; stages that act on the whole generation wrap that generator.
+    """
+
+    def __init__(self, stages: Sequence[Stage], terminal: Callable[[Generation], Awaitable[Any]]):
+        self.stages = list(stages)
+        self.terminal = terminal
+
+    async def run(self, generation: Generation) -> Any:
+        return await self._call(generation, 0)
+
+    async def _call(self, generation: Generation, index: int) -> Any:
+        if index == len(self.stages):
+            return await self.terminal(generation)
+        return await self.stages[index](generation, lambda: self._call(generation, index + 1))
+
+
+async def stream_within(chunks: AsyncGenerator[str, None], context: AsyncContextManager) -> AsyncGenerator[str, None]:
+    """Relays a stream's chunks inside `context`, which is entered at the first chunk and left at the end.
+
+    The wrapped stream is closed however this one ends, so a client going away still stops the upstream call.
+    """
+    try:
+        async with context:
+            async for chunk in chunks:
+                yield chunk
+    finally:
+        await chunks.aclose()
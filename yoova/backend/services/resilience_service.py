@@ -0,0 +1,140 @@
+import asyncio
+import math
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable
+
+from fastapi import HTTPException
+
+from utils.helpers import current_deadline
+
+# Upstream statuses that signal a transient failure rather than a bad request.
+TRANSIENT_STATUSES = {500, 502, 503, 504}
+
+
+class UpstreamUnavailable(Exception):
+    """A transient upstream failure (5xx, connection reset, timeout) that is worth retrying."""
+
+    def __init__(self, status_code: int, detail: str, response: Any = None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.response = response
+
+
+class CircuitBreaker:
+    """Fails fast while the upstream is unhealthy.
+
+    After `failure_threshold` consecutive failures the circuit opens and every call gets
+    an immediate 503 for `reset_timeout` seconds. Then a single probe is let through
+    (half-open): its success closes the circuit, its failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> None:
+        """Raises a 503 unless a call may go to the upstream now."""
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._probe_in_flight = False
+            if self.state == "closed":
+                return
+            if self.state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            self.rejected += 1
+            retry_after = max(1, math.ceil(self.opened_at + self.reset_timeout - time.monotonic()))
+        raise HTTPException(
+            status_code=503,
+            detail="Gemini API is currently unavailable, please retry later.",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_abandoned(self) -> None:
+        """The call ended without saying anything about upstream health (cancelled, rejected locally)."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.times_opened += 1
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "failure_threshold": self.failure_threshold,
+                "reset_timeout_seconds": self.reset_timeout,
+                "open_for_seconds": round(max(0.0, self.opened_at + self.reset_timeout - time.monotonic()), 3) if self.state == "open" else 0.0,
+                "times_opened": self.times_opened,
+                "rejected": self.rejected,
+            }
+
+
+class Resilience:
+    """Retries transient upstream failures with capped, fully jittered exponential backoff,
+    behind a circuit breaker. Generations are idempotent, so any of them may be retried.
+    """
+
+    def __init__(self, breaker: CircuitBreaker, attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8):
+        self.breaker = breaker
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = 0
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    @staticmethod
+    def _has_time_for(delay: float) -> bool:
+        """Whether the request's deadline leaves room to back off and try again."""
+        deadline = current_deadline.get()
+        return deadline is None or deadline.remaining() > delay
+
+    async def acall(self, fn: Callable[..., Awaitable[Any]], *args) -> Any:
+        """Runs an async upstream call with retries."""
+        for attempt in range(self.attempts):
+            self.breaker.allow()
+            try:
+                result = await fn(*args)
+            except UpstreamUnavailable as e:
+                self.breaker.record_failure()
+                delay = self.backoff(attempt)
+                if attempt + 1 >= self.attempts or not self._has_time_for(delay):
+                    raise HTTPException(status_code=e.status_code, detail=e.detail)
+                self.retries += 1
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                self.breaker.record_abandoned()
+                raise
+            self.breaker.record_success()
+            return result
+
+    def stats(self) -> dict:
+        return {"attempts": self.attempts, "retries": self.retries, "circuit_breaker": self.breaker.stats()}
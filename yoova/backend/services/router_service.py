@@ -0,0 +1,121 @@
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+# Backend of a model named without a "backend/" prefix.
+DEFAULT_BACKEND = "gemini"
+
+
+class ModelRouter:
+    """Picks the model for each generation from its endpoint's route: preferred model first, then fallbacks.
+
+    A model is a name on the default backend ("gemini-1.5-flash") or "backend/name" on another
+    one. Backends are base URLs of servers speaking Gemini's generateContent protocol, so a
+    local stand-in model server can take the place of the API.
+
+    The first model in the route that suits the endpoint wins: it can produce the endpoint's
+    output length, and over the last `window` seconds its error rate stayed under
+    `max_error_rate` and its p95 latency under the endpoint's target. A model with fewer than
+    `min_samples` recent calls counts as suitable, so a demoted model is tried again once its
+    failures age out. If none suits, the one with the fewest errors, then the lowest p95, is used.
+    """
+
+    def __init__(self, backends: Dict[str, str], routes: Dict[str, List[str]], default_route: List[str],
+                 targets: Dict[str, float], default_target: float, output_limits: Optional[Dict[str, int]] = None,
+                 output_needs: Optional[Dict[str, int]] = None, window: float = 300, max_error_rate: float = 0.2,
+                 min_samples: int = 5):
+        self.backends = backends
+        self.routes = routes
+        self.default_route = default_route
+        self.targets = targets
+        self.default_target = default_target
+        self.output_limits = output_limits or {}
+        self.output_needs = output_needs or {}
+        self.window = window
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.fallbacks = 0
+        self._urls = {model: self._build_url(model) for route in [default_route, *routes.values()] for model in route}
+        self._models = {url: model for model, url in self._urls.items()}
+        self._samples: Dict[Tuple[str, str], Deque[Tuple[float, float, bool]]] = {}
+        self._lock = threading.Lock()
+
+    def _build_url(self, model: str) -> str:
+        backend, _, name = model.rpartition("/")
+        base = self.backends.get(backend or DEFAULT_BACKEND)
+        if base is None:
+            raise ValueError(f"Model {model!r} names unknown backend {backend!r}")
+        return f"{base.rstrip('/')}/models/{name}:generateContent"
+
+    def route(self, endpoint: Optional[str]) -> List[str]:
+        return self.routes.get(endpoint, self.default_route)
+
+    def url(self, model: str) -> str:
+        """generateContent URL of a model from one of the routes."""
+        return self._urls[model]
+
+    def choose(self, endpoint: Optional[str]) -> str:
+        """Model for the next generation through `endpoint`."""
+        with self._lock:
+            model = self._choose(endpoint, time.monotonic())
+        if model != self.route(endpoint)[0]:
+            self.fallbacks += 1
+        return model
+
+    def record(self, endpoint: Optional[str], url: str, seconds: float, ok: bool) -> None:
+        """Records one upstream call; `ok` is False for upstream failures and timeouts."""
+        model = self._models.get(url)
+        if model is None:
+            # Sent somewhere the router did not pick, e.g. the degraded fast model.
+            return
+        with self._lock:
+            samples = self._samples.setdefault((endpoint or "", model), deque())
+            samples.append((time.monotonic(), seconds, ok))
+
+    def _choose(self, endpoint: Optional[str], now: float) -> str:
+        route = self.route(endpoint)
+        need = self.output_needs.get(endpoint, 0)
+        candidates = [model for model in route if self.output_limits.get(model, need) >= need] or route
+        target = self.targets.get(endpoint, self.default_target)
+        health = {model: self._health(endpoint, model, now) for model in candidates}
+        for model in candidates:
+            samples, error_rate, p95 = health[model]
+            if samples < self.min_samples or (error_rate < self.max_error_rate and (p95 is None or p95 <= target)):
+                return model
+        return min(candidates, key=lambda model: (health[model][1], health[model][2] or 0.0))
+
+    def _health(self, endpoint: Optional[str], model: str, now: float) -> Tuple[int, float, Optional[float]]:
+        """Recent (calls, error rate, p95 latency of successful calls) of `model` for `endpoint`."""
+        samples = self._samples.get((endpoint or "", model))
+        if not samples:
+            return 0, 0.0, None
+        while samples and samples[0][0] < now - self.window:
+            samples.popleft()
+        if not samples:
+            return 0, 0.0, None
+        error_rate = sum(1 for _, _, ok in samples if not ok) / len(samples)
+        latencies = sorted(seconds for _, seconds, ok in samples if ok)
+        p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] if latencies else None
+        return len(samples), error_rate, p95
+
+    def stats(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            endpoints = sorted(set(self.routes) | {endpoint for endpoint, _ in self._samples if endpoint})
+            result = {}
+            for endpoint in endpoints:
+                models = {}
+                for model in self.route(endpoint):
+                    samples, error_rate, p95 = self._health(endpoint, model, now)
+                    models[model] = {
+                        "samples": samples,
+                        "error_rate": round(error_rate, 4),
+                        "p95_seconds": round(p95, 4) if p95 is not None else None,
+                    }
+                result[endpoint] = {
+                    "target_p95_seconds": self.targets.get(endpoint, self.default_target),
+                    "choice": self._choose(endpoint, now),
+                    "models": models,
+                }
+            return {"fallbacks": self.fallbacks, "endpoints": result}
@@ -0,0 +1,204 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, Optional, Tuple
+
+# Highest priority first.
+PRIORITY_CLASSES = ("interactive", "standard", "bulk")
+
+# (enqueued at, user, future) for one waiting generation.
+Waiter = Tuple[float, str, asyncio.Future]
+
+
+def lowest_priority(*priorities: str) -> str:
+    """The least urgent of the given classes; callers may lower their class, never raise it."""
+    return max(priorities, key=PRIORITY_CLASSES.index)
+
+
+class FairQueue:
+    """Waiters of one priority class, shared between users by deficit round robin.
+
+    Each user has their own FIFO. Users take turns; a turn adds `weight` credits to the
+    user's deficit and every grant spends one, so under contention each user gets
+    throughput in proportion to their weight however many requests they queue.
+    """
+
+    def __init__(self):
+        self.queues: Dict[str, Deque[Waiter]] = {}
+        self.ring: Deque[str] = deque()
+        self.deficits: Dict[str, float] = {}
+
+    def __len__(self) -> int:
+        return sum(len(queue) for queue in self.queues.values())
+
+    def push(self, waiter: Waiter) -> None:
+        user = waiter[1]
+        if user not in self.queues:
+            self.queues[user] = deque()
+            self.ring.append(user)
+            self.deficits[user] = 0.0
+        self.queues[user].append(waiter)
+
+    def remove(self, waiter: Waiter) -> None:
+        queue = self.queues.get(waiter[1])
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            self._drop_if_idle(waiter[1])
+
+    def oldest(self) -> Optional[Waiter]:
+        return min((queue[0] for queue in self.queues.values()), key=lambda waiter: waiter[0], default=None)
+
+    def pop(self, weight_of) -> Waiter:
+        """Next waiter in deficit round robin order."""
+        while True:
+            user = self.ring[0]
+            if self.deficits[user] >= 1:
+                return self._take(user)
+            self.ring.rotate(-1)
+            self.deficits[self.ring[0]] += weight_of(self.ring[0])
+
+    def pop_oldest(self) -> Waiter:
+        """Oldest waiter regardless of turn; it is still charged to its user's deficit."""
+        return self._take(self.oldest()[1])
+
+    def _take(self, user: str) -> Waiter:
+        self.deficits[user] -= 1
+        waiter = self.queues[user].popleft()
+        self._drop_if_idle(user)
+        return waiter
+
+    def _drop_if_idle(self, user: str) -> None:
+        if not self.queues[user]:
+            # Credit does not carry over an idle period.
+            del self.queues[user]
+            del self.deficits[user]
+            self.ring.remove(user)
+
+
+class PriorityScheduler:
+    """Hands out a fixed number of Gemini generation slots, most urgent class first.
+
+    Within a class users are served by weighted deficit round robin, so one tenant's
+    backlog cannot crowd out the others; when there is no contention anyone may use every
+    free slot. A waiter that has waited longer than `starvation_after` seconds is served
+    ahead of every class, so bulk work keeps moving while interactive traffic never lets up.
+    """
+
+    def __init__(self, slots: int = 64, starvation_after: float = 10, weights: Optional[Dict[str, float]] = None,
+                 max_tracked_users: int = 1000):
+        self.slots = slots
+        self.starvation_after = starvation_after
+        self.weights = weights or {}
+        self.max_tracked_users = max_tracked_users
+        self.in_use = 0
+        self.promoted = 0
+        self._classes: Dict[str, FairQueue] = {name: FairQueue() for name in PRIORITY_CLASSES}
+        self._granted = {name: 0 for name in PRIORITY_CLASSES}
+        self._total_wait = {name: 0.0 for name in PRIORITY_CLASSES}
+        self._users: "OrderedDict[str, Dict[str, float]]" = OrderedDict()
+
+    def weight_of(self, user: str) -> float:
+        return max(0.01, self.weights.get(user, 1.0))
+
+    @asynccontextmanager
+    async def slot(self, priority: str, user: str = "anonymous") -> AsyncIterator[None]:
+        """Holds one generation slot for the duration of the block."""
+        await self.acquire(priority, user)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self, priority: str, user: str = "anonymous") -> None:
+        stats = self._user_stats(user)
+        if self.in_use < self.slots and not any(self._classes.values()):
+            self.in_use += 1
+            self._record_grant(priority, stats, 0.0)
+            return
+        waiter = (time.monotonic(), user, asyncio.get_running_loop().create_future())
+        self._classes[priority].push(waiter)
+        stats["waiting"] += 1
+        try:
+            await waiter[2]
+        except asyncio.CancelledError:
+            if waiter[2].done() and not waiter[2].cancelled():
+                # Granted just as the caller gave up: pass the slot on.
+                self.release()
+            else:
+                self._classes[priority].remove(waiter)
+            raise
+        finally:
+            stats["waiting"] -= 1
+        self._record_grant(priority, stats, time.monotonic() - waiter[0])
+
+    def release(self) -> None:
+        self.in_use -= 1
+        while self.in_use < self.slots:
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+            if not waiter[2].done():
+                self.in_use += 1
+                waiter[2].set_result(None)
+
+    def waiting_ahead(self, priority: str) -> int:
+        """Waiters a new `priority` request would queue behind: its own class and every more urgent one."""
+        return sum(len(self._classes[name]) for name in PRIORITY_CLASSES[:PRIORITY_CLASSES.index(priority) + 1])
+
+    def _next_waiter(self) -> Optional[Waiter]:
+        busy = [queue for queue in self._classes.values() if queue]
+        if not busy:
+            return None
+        oldest = min(busy, key=lambda queue: queue.oldest()[0])
+        if time.monotonic() - oldest.oldest()[0] >= self.starvation_after:
+            if oldest is not busy[0]:
+                self.promoted += 1
+            return oldest.pop_oldest()
+        return busy[0].pop(self.weight_of)
+
+    def _user_stats(self, user: str) -> Dict[str, float]:
+        stats = self._users.get(user)
+        if stats is None:
+            stats = self._users[user] = {"waiting": 0, "granted": 0, "total_wait": 0.0, "max_wait": 0.0}
+            if len(self._users) > self.max_tracked_users:
+                # Forget the least recently seen user that has nothing queued.
+                for name, old in self._users.items():
+                    if not old["waiting"] and name != user:
+                        del self._users[name]
+                        break
+        self._users.move_to_end(user)
+        return stats
+
+    def _record_grant(self, priority: str, stats: Dict[str, float], wait: float) -> None:
+        self._granted[priority] += 1
+        self._total_wait[priority] += wait
+        stats["granted"] += 1
+        stats["total_wait"] += wait
+        stats["max_wait"] = max(stats["max_wait"], wait)
+
+    def stats(self) -> dict:
+        return {
+            "slots": self.slots,
+            "in_use": self.in_use,
+            "starvation_after_seconds": self.starvation_after,
+            "promoted": self.promoted,
+            "classes": {
+                name: {
+                    "waiting": len(self._classes[name]),
+                    "granted": self._granted[name],
+                    "avg_wait_seconds": round(self._total_wait[name] / self._granted[name], 3) if self._granted[name] else 0.0,
+                }
+                for name in PRIORITY_CLASSES
+            },
+            "users": {
+                user: {
+                    "weight": self.weight_of(user),
+                    "waiting": stats["waiting"],
+                    "granted": stats["granted"],
+                    "avg_wait_seconds": round(stats["total_wait"] / stats["granted"], 3) if stats["granted"] else 0.0,
+                    "max_wait_seconds": round(stats["max_wait"], 3),
+                }
+                for user, stats in self._users.items()
+            },
+        }
@@ -0,0 +1,91 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+import httpx
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, "files"))
+
+# The app reads its configuration at import time: keep it off the real database and API key.
+os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(), "test.db")
+os.environ["GOOGLE_GEMINI_API_KEY"] = "test-key"
+
+
+class FakeGemini:
+    """Answers Gemini generateContent and streamGenerateContent calls through httpx.MockTransport.
+
+    Queue `(status, body, headers)` tuples on `replies` to script the next answers; otherwise
+    every call succeeds with text echoing the model and prompt, after `delay` seconds. Streams
+    wait `chunk_delay` seconds before each chunk.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.replies = []
+        self.delay = 0.0
+        self.chunk_delay = 0.0
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content or b"{}")
+        self.calls.append({"url": str(request.url), "key": request.headers.get("x-goog-api-key"), "body": body,
+                           "timeout": request.extensions.get("timeout")})
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.replies:
+            status, reply, headers = self.replies.pop(0)
+            return httpx.Response(status, json=reply, headers=headers)
+        model = request.url.path.rsplit("/", 1)[-1].split(":")[0]
+        if ":streamGenerateContent" in request.url.path:
+            return httpx.Response(200, content=self.chunks(), headers={"Content-Type": "text/event-stream"})
+        config = body.get("generationConfig", {})
+        text = f"[{model}] " + body["contents"][-1]["parts"][0]["text"][:40]
+        if config.get("responseMimeType") == "application/json":
+            schema = config.get("responseSchema", {})
+            if schema.get("type") == "ARRAY":
+                text = json.dumps([f"option{i}" for i in range(3)])
+            else:
+                text = json.dumps({name: f"{name} text" for name in schema.get("properties", {})})
+        return httpx.Response(200, json={"candidates": [{"content": {"parts": [{"text": text}]}}],
+                                         "usageMetadata": {"totalTokenCount": 30}})
+
+    async def chunks(self):
+        for i in range(3):
+            if self.chunk_delay:
+                await asyncio.sleep(self.chunk_delay)
+            yield ("data: " + json.dumps({"candidates": [{"content": {"parts": [{"text": f"chunk{i} "}]}}]}) + "\r\n\r\n").encode()
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def app_module():
+    import app
+    return app
+
+
+@pytest.fixture
+async def gemini(app_module):
+    """The app's Gemini client, talking to a fresh FakeGemini."""
+    fake = FakeGemini()
+    previous = app_module.gemini.async_client
+    app_module.gemini.async_client = httpx.AsyncClient(transport=fake.transport())
+    yield fake
+    await app_module.gemini.async_client.aclose()
+    app_module.gemini.async_client = previous
+
+
+@pytest.fixture
+async def client(app_module, gemini):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app_module.app), base_url="http://test") as client:
+        yield client
@@ -0,0 +1,27 @@
+import asyncio
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_concurrent_burst_is_shed_with_retry_after(client, gemini, app_module, monkeypatch):
+    monkeypatch.setattr(app_module.scheduler, "slots", 1)
+    monkeypatch.setattr(app_module.admission, "max_wait", 10)
+    monkeypatch.setattr(app_module.admission, "_typical_latency", lambda endpoint: 5.0)
+    gemini.delay = 0.05
+
+    responses = await asyncio.gather(*(client.post("/x/generate-tweet", json={"topic": f"burst {i}"}) for i in range(8)))
+
+    statuses = sorted(response.status_code for response in responses)
+    assert statuses == [200] * 3 + [503] * 5
+    assert all(int(response.headers["Retry-After"]) >= 1 for response in responses if response.status_code == 503)
+    assert app_module.admission.stats()["on_the_way"] == 0
+    assert app_module.scheduler.stats()["in_use"] == 0
+
+
+async def test_finished_stream_leaves_no_admission_backlog(client, app_module):
+    response = await client.post("/youtube/generate-script/stream", json={"topic": "admitted stream"})
+
+    assert response.status_code == 200
+    assert app_module.admission.stats()["on_the_way"] == 0
@@ -0,0 +1,46 @@
+import pytest
+from fastapi import HTTPException
+
+from services.admission_service import AdmissionController
+from services.metrics_service import LatencyTracker
+from services.scheduler_service import PriorityScheduler
+
+pytestmark = pytest.mark.anyio
+
+
+def controller(slots: int = 1, max_wait: float = 10) -> AdmissionController:
+    return AdmissionController(PriorityScheduler(slots=slots), LatencyTracker(), max_wait=max_wait, default_latency=5.0)
+
+
+def test_generations_on_their_way_to_a_slot_count_as_backlog():
+    admission = controller()
+
+    for _ in range(3):
+        admission.admit("/x/generate-tweet", "interactive")
+    with pytest.raises(HTTPException) as shed:
+        admission.admit("/x/generate-tweet", "interactive")
+
+    assert shed.value.status_code == 503
+    assert shed.value.headers["Retry-After"] == "5"
+    assert admission.stats()["on_the_way"] == 3
+
+
+def test_arrived_generations_stop_counting():
+    admission = controller()
+    for _ in range(3):
+        admission.admit("/x/generate-tweet", "interactive")
+
+    admission.arrived("interactive")
+
+    admission.admit("/x/generate-tweet", "interactive")
+
+
+def test_less_urgent_generations_do_not_hold_back_urgent_ones():
+    admission = controller()
+    for _ in range(3):
+        admission.admit("/x/generate-tweet", "bulk")
+
+    admission.admit("/x/generate-tweet", "interactive")
+
+    with pytest.raises(HTTPException):
+        admission.admit("/x/generate-tweet", "bulk")
@@ -0,0 +1,45 @@
+import httpx
+import pytest
+
+from models.ai_model import GeminiClient
+from services.key_pool_service import KeyPool
+from services.limiter_service import RateLimiter
+
+pytestmark = pytest.mark.anyio
+
+URL = "https://gemini.test/v1beta/models/gemini-1.5-flash:generateContent"
+PAYLOAD = {"contents": [{"parts": [{"text": "Write a tweet."}]}]}
+
+
+def client_for(gemini, keys):
+    pool = KeyPool(keys, rpm=600, tpm=1_000_000)
+    limiter = RateLimiter(rpm=600 * len(keys), tpm=1_000_000 * len(keys))
+    client = GeminiClient(URL, keys[0], limiter=limiter, keys=pool)
+    client.async_client = httpx.AsyncClient(transport=gemini.transport())
+    return client, pool, limiter
+
+
+async def test_single_key_429_backs_off_instead_of_benching_the_key(gemini):
+    client, pool, limiter = client_for(gemini, ["only"])
+    gemini.replies.append((429, {"error": {"message": "quota"}}, {}))
+
+    text = await client.agenerate_text(PAYLOAD, "a tweet")
+    again = await client.agenerate_text({"contents": [{"parts": [{"text": "Another tweet."}]}]}, "a tweet")
+
+    assert text.startswith("[gemini-1.5-flash]") and again
+    assert len(gemini.calls) == 3
+    assert pool.available() == 1
+    assert limiter.stats()["throttled"] == 1
+    await client.aclose()
+
+
+async def test_429_moves_to_another_key(gemini):
+    client, pool, limiter = client_for(gemini, ["key-a", "key-b"])
+    gemini.replies.append((429, {"error": {"message": "quota"}}, {}))
+
+    await client.agenerate_text(PAYLOAD, "a tweet")
+
+    assert len({call["key"] for call in gemini.calls}) == 2
+    assert pool.available() == 1
+    assert limiter.stats()["throttled"] == 0
+    await client.aclose()
@@ -0,0 +1,24 @@
+import json
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_batch_items_match_endpoint_response(client):
+    params = {"topic": "batch shape", "count": 2}
+    endpoint = await client.post("/x/generate-tweet", json=params)
+    batch = await client.post("/batch", json={"jobs": [{"generator": "tweet", "params": params}]})
+
+    assert endpoint.status_code == 200
+    item = json.loads(batch.text.splitlines()[0])
+    assert item["status"] == 200
+    assert item["result"] == endpoint.json()
+    assert set(item["result"]) == {"tweet", "candidates"}
+
+
+async def test_batch_text_generator_returns_response_model(client):
+    batch = await client.post("/batch", json={"jobs": [{"generator": "email", "params": {"topic": "batch email"}}]})
+
+    item = json.loads(batch.text.splitlines()[0])
+    assert list(item["result"]) == ["email_content"]
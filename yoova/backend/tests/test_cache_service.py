@@ -0,0 +1,39 @@
+import sqlite3
+
+import pytest
+
+from services.cache_service import ResponseCache, TieredCache
+
+pytestmark = pytest.mark.anyio
+
+
+class LockedStore:
+    """ResponseCacheStore stand-in whose every query fails like a locked SQLite database."""
+
+    def get(self, key, stale_for=0):
+        raise sqlite3.OperationalError("database is locked")
+
+    def set(self, key, label, value, ttl):
+        raise sqlite3.OperationalError("database is locked")
+
+    def stats(self):
+        return {}
+
+
+async def test_store_errors_are_a_miss_and_a_skipped_write():
+    cache = TieredCache(ResponseCache(), LockedStore())
+
+    assert await cache.get("key") is None
+    assert await cache.get_stale("key", 60) is None
+    await cache.set("key", "value", 60)
+
+    assert await cache.get("key") == "value"
+    assert (await cache.stats())["store_errors"] == 3
+
+
+async def test_locked_cache_does_not_fail_a_generation(client, app_module, monkeypatch):
+    monkeypatch.setattr(app_module.response_cache, "store", LockedStore())
+
+    response = await client.post("/x/generate-tweet", json={"topic": "locked cache"})
+
+    assert response.status_code == 200
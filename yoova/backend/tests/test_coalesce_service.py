@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from services.coalesce_service import SingleFlight
+from utils.helpers import Deadline, current_deadline
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_concurrent_calls_share_one_execution():
+    flights = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "done"
+
+    results = await asyncio.gather(*(flights.ado("key", work) for _ in range(5)))
+
+    assert results == ["done"] * 5
+    assert len(calls) == 1
+    assert flights.stats() == {"executed": 1, "coalesced": 4, "in_flight": 0}
+
+
+async def test_errors_reach_every_caller():
+    flights = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise HTTPException(status_code=502, detail="upstream")
+
+    results = await asyncio.gather(*(flights.ado("key", fail) for _ in range(3)), return_exceptions=True)
+
+    assert [result.status_code for result in results] == [502, 502, 502]
+
+
+async def test_tight_deadline_of_first_caller_does_not_fail_followers():
+    flights = SingleFlight()
+    seen = []
+
+    async def work():
+        await asyncio.sleep(0.2)
+        seen.append(current_deadline.get().remaining())
+        return "done"
+
+    async def call(budget):
+        current_deadline.set(Deadline(budget))
+        return await flights.ado("key", work)
+
+    leader = asyncio.ensure_future(call(0.05))
+    await asyncio.sleep(0)
+    follower = asyncio.ensure_future(call(5))
+
+    with pytest.raises(HTTPException) as exceeded:
+        await leader
+    assert exceeded.value.status_code == 504
+    assert "0.05s" in exceeded.value.detail
+    assert await follower == "done"
+    # The shared call ran under the follower's deadline, not the leader's.
+    assert seen[0] > 4
+
+
+async def test_call_is_cancelled_once_every_caller_is_gone():
+    flights = SingleFlight()
+    cancelled = asyncio.Event()
+
+    async def work():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    async def call():
+        current_deadline.set(Deadline(0.05))
+        return await flights.ado("key", work)
+
+    results = await asyncio.gather(call(), call(), return_exceptions=True)
+
+    assert all(isinstance(result, HTTPException) for result in results)
+    await asyncio.wait_for(cancelled.wait(), 1)
+
+
+async def test_caller_arriving_while_the_abandoned_call_cancels_starts_a_new_one():
+    flights = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        try:
+            await asyncio.sleep(0.05)
+        except asyncio.CancelledError:
+            # Cleanup that takes a while, e.g. closing the upstream response.
+            await asyncio.sleep(0.05)
+            raise
+        return "done"
+
+    abandoned = asyncio.ensure_future(flights.ado("key", work))
+    await asyncio.sleep(0.01)
+    abandoned.cancel()
+    await asyncio.sleep(0)
+
+    assert await flights.ado("key", work) == "done"
+    assert len(calls) == 2
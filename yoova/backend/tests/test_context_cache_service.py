@@ -0,0 +1,75 @@
+import httpx
+import pytest
+
+from models.ai_model import GeminiClient
+from services.context_cache_service import ContextCache
+
+pytestmark = pytest.mark.anyio
+
+URL = "https://gemini.test/v1beta/models/gemini-1.5-flash:generateContent"
+INSTRUCTION = {"parts": [{"text": "You are a brand copywriter. " * 20}]}
+PAYLOAD = {"systemInstruction": INSTRUCTION, "contents": [{"parts": [{"text": "Write a tweet."}]}]}
+
+
+def client_for(gemini, cache):
+    client = GeminiClient(URL, "test-key", context_cache=cache)
+    client.async_client = httpx.AsyncClient(transport=gemini.transport())
+    return client
+
+
+def generate_calls(gemini):
+    return [call for call in gemini.calls if ":generateContent" in call["url"]]
+
+
+async def test_long_prefix_is_sent_by_handle(gemini):
+    client = client_for(gemini, ContextCache(min_tokens=10))
+    gemini.replies.append((200, {"name": "cachedContents/brand"}, {}))
+
+    await client.agenerate_text(PAYLOAD, "a tweet")
+
+    assert gemini.calls[0]["url"].endswith("/v1beta/cachedContents")
+    sent = generate_calls(gemini)[0]["body"]
+    assert sent["cachedContent"] == "cachedContents/brand"
+    assert "systemInstruction" not in sent
+    await client.aclose()
+
+
+async def test_failed_create_falls_back_to_the_inline_prefix(gemini):
+    cache = ContextCache(min_tokens=10)
+    client = client_for(gemini, cache)
+    gemini.replies.append((500, {"error": {"message": "unavailable"}}, {}))
+
+    text = await client.agenerate_text(PAYLOAD, "a tweet")
+    await client.agenerate_text({**PAYLOAD, "contents": [{"parts": [{"text": "Another tweet."}]}]}, "a tweet")
+
+    assert text.startswith("[gemini-1.5-flash]")
+    assert all(call["body"]["systemInstruction"] == INSTRUCTION for call in generate_calls(gemini))
+    assert len(gemini.calls) == 3  # The create is not retried until retry_after has passed.
+    assert cache.stats()["failed"] == 1
+    await client.aclose()
+
+
+async def test_expired_handle_is_registered_again(gemini):
+    cache = ContextCache(min_tokens=10)
+    client = client_for(gemini, cache)
+    gemini.replies += [
+        (200, {"name": "cachedContents/old"}, {}),
+        (404, {"error": {"message": "CachedContent not found"}}, {}),
+        (200, {"name": "cachedContents/new"}, {}),
+    ]
+
+    await client.agenerate_text(PAYLOAD, "a tweet")
+
+    assert [call["body"]["cachedContent"] for call in generate_calls(gemini)] == ["cachedContents/old", "cachedContents/new"]
+    assert cache.stats()["invalidated"] == 1
+    await client.aclose()
+
+
+async def test_short_prefix_stays_inline(gemini):
+    client = client_for(gemini, ContextCache(min_tokens=10_000))
+
+    await client.agenerate_text(PAYLOAD, "a tweet")
+
+    assert len(gemini.calls) == 1
+    assert gemini.calls[0]["body"]["systemInstruction"] == INSTRUCTION
+    await client.aclose()
@@ -0,0 +1,27 @@
+import pytest
+
+from services.degradation_service import DEGRADATION_LEVELS
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def degraded(app_module, monkeypatch):
+    monkeypatch.setattr(app_module.degradation, "level", lambda: DEGRADATION_LEVELS.index("fast-model"))
+
+
+async def test_stream_routes_get_short_output_when_degraded(client, gemini, degraded, app_module):
+    response = await client.post("/youtube/generate-script/stream", json={"topic": "degraded stream"})
+
+    assert response.status_code == 200
+    assert response.headers["X-Degraded"] == "short-output"
+    assert ":streamGenerateContent" in gemini.calls[-1]["url"]
+    assert gemini.calls[-1]["body"]["generationConfig"]["maxOutputTokens"] == app_module.DEGRADED_MAX_OUTPUT_TOKENS
+
+
+async def test_cheap_endpoints_get_the_fast_model_when_degraded(client, gemini, degraded, app_module):
+    response = await client.post("/x/generate-tweet", json={"topic": "degraded tweet"})
+
+    assert response.status_code == 200
+    assert response.headers["X-Degraded"] == "fast-model"
+    assert f"/models/{app_module.GEMINI_FAST_MODEL}:" in gemini.calls[-1]["url"]
@@ -0,0 +1,87 @@
+import asyncio
+import json
+
+import pytest
+
+from services.disconnect_service import DisconnectCanceller, DisconnectCounter
+
+pytestmark = pytest.mark.anyio
+
+
+def http_scope(path: str) -> dict:
+    return {"type": "http", "method": "POST", "path": path, "headers": [(b"content-type", b"application/json")],
+            "query_string": b"", "client": ("10.0.0.1", 1234), "server": ("test", 80), "scheme": "http",
+            "root_path": "", "http_version": "1.1", "raw_path": path.encode()}
+
+
+class Client:
+    """ASGI receive/send pair for a client that sends `body` and hangs up once `hang_up` is set."""
+
+    def __init__(self, body: dict):
+        self.messages = [{"type": "http.request", "body": json.dumps(body).encode(), "more_body": False}]
+        self.hang_up = asyncio.Event()
+        self.sent = []
+
+    async def receive(self):
+        if self.messages:
+            return self.messages.pop(0)
+        await self.hang_up.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(self, message):
+        self.sent.append(message)
+
+
+async def test_client_disconnect_cancels_the_upstream_call():
+    upstream_cancelled = asyncio.Event()
+
+    async def app(scope, receive, send):
+        await receive()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            upstream_cancelled.set()
+            raise
+
+    counter = DisconnectCounter()
+    middleware = DisconnectCanceller(app, ["/x/generate-tweet"], counter)
+    client = Client({"topic": "gone"})
+
+    served = asyncio.create_task(middleware(http_scope("/x/generate-tweet"), client.receive, client.send))
+    await asyncio.sleep(0.01)
+    client.hang_up.set()
+    await asyncio.wait_for(served, 1)
+
+    assert upstream_cancelled.is_set()
+    assert counter.stats() == {"requests_cancelled": 1, "by_endpoint": {"/x/generate-tweet": 1}}
+
+
+async def test_disconnect_after_the_response_is_not_counted():
+    async def app(scope, receive, send):
+        await receive()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"done"})
+
+    counter = DisconnectCounter()
+    client = Client({"topic": "stayed"})
+    client.hang_up.set()
+
+    await DisconnectCanceller(app, ["/x/generate-tweet"], counter)(http_scope("/x/generate-tweet"), client.receive, client.send)
+
+    assert client.sent[-1]["body"] == b"done"
+    assert counter.stats()["requests_cancelled"] == 0
+
+
+async def test_app_stops_its_gemini_call_when_the_client_leaves(app_module, gemini):
+    gemini.delay = 5
+    cancelled = app_module.gemini.stats()["upstream_cancelled"]
+    client = Client({"topic": "abandoned tweet"})
+
+    served = asyncio.create_task(app_module.app(http_scope("/x/generate-tweet"), client.receive, client.send))
+    while not gemini.calls:
+        await asyncio.sleep(0.01)
+    client.hang_up.set()
+    await asyncio.wait_for(served, 1)
+
+    assert app_module.gemini.stats()["upstream_cancelled"] == cancelled + 1
+    assert app_module.disconnects.stats()["by_endpoint"]["/x/generate-tweet"] >= 1
@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+import pytest
+
+from services.hedge_service import Hedger
+from services.metrics_service import LatencyTracker
+from utils.helpers import Deadline, current_deadline
+
+pytestmark = pytest.mark.anyio
+
+P95 = 0.1
+
+
+def hedger_for(budget: float = 1.0, samples: int = 20) -> Hedger:
+    latency = LatencyTracker()
+    for _ in range(samples):
+        latency.record("tweet", P95)
+    return Hedger(latency, percentile=95, budget=budget, min_samples=20)
+
+
+class Upstream:
+    """Calls whose latencies are scripted in order; records when each one started."""
+
+    def __init__(self, *latencies: float):
+        self.latencies = list(latencies)
+        self.started = []
+        self.cancelled = 0
+
+    async def call(self):
+        index = len(self.started)
+        self.started.append(time.monotonic())
+        try:
+            await asyncio.sleep(self.latencies[index])
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return index
+
+
+async def test_fast_call_is_not_hedged():
+    hedger, upstream = hedger_for(), Upstream(0.01)
+
+    assert await hedger.run("tweet", upstream.call) == 0
+    assert len(upstream.started) == 1
+    assert hedger.stats()["hedged"] == 0
+
+
+async def test_slow_call_is_hedged_after_the_p95_delay():
+    hedger, upstream = hedger_for(), Upstream(1.0, 0.01)
+
+    assert await hedger.run("tweet", upstream.call) == 1
+    await asyncio.sleep(0)
+
+    assert upstream.started[1] - upstream.started[0] >= P95 * 0.9
+    assert upstream.cancelled == 1
+    assert hedger.stats()["hedge_wins"] == 1
+
+
+async def test_hedges_stay_within_budget():
+    hedger = hedger_for(budget=0.5)
+
+    for _ in range(4):
+        await hedger.run("tweet", Upstream(0.2, 0.2).call)
+
+    stats = hedger.stats()
+    assert stats["hedged"] == 2
+    assert stats["over_budget"] == 2
+
+
+async def test_no_hedge_without_enough_samples():
+    hedger, upstream = hedger_for(samples=5), Upstream(0.2)
+
+    await hedger.run("tweet", upstream.call)
+
+    assert len(upstream.started) == 1
+
+
+async def test_no_hedge_that_could_not_finish_before_the_deadline():
+    hedger, upstream = hedger_for(), Upstream(0.2)
+    token = current_deadline.set(Deadline(P95 / 2))
+    try:
+        await hedger.run("tweet", upstream.call)
+    finally:
+        current_deadline.reset(token)
+
+    assert len(upstream.started) == 1
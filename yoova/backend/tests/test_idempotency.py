@@ -0,0 +1,22 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_keys_differing_only_in_case_are_distinct(client):
+    first = await client.post("/x/generate-tweet", json={"topic": "idempotent upper"}, headers={"Idempotency-Key": "K"})
+    second = await client.post("/x/generate-tweet", json={"topic": "idempotent lower"}, headers={"Idempotency-Key": "k"})
+
+    assert first.status_code == second.status_code == 200
+    assert "Idempotent-Replayed" not in second.headers
+
+
+async def test_retry_with_the_same_key_is_replayed(client, gemini):
+    body = {"topic": "idempotent retry"}
+    first = await client.post("/x/generate-tweet", json=body, headers={"Idempotency-Key": "retry-1"})
+    calls = len(gemini.calls)
+    retry = await client.post("/x/generate-tweet", json=body, headers={"Idempotency-Key": "retry-1"})
+
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json() == first.json()
+    assert len(gemini.calls) == calls
@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+from services.idempotency_service import IdempotencyConflict, IdempotencyStore
+
+pytestmark = pytest.mark.anyio
+
+
+def responder(status: int = 200, delay: float = 0.0):
+    calls = []
+
+    async def execute():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return {"status": status, "headers": {}, "body": f"response {len(calls)}"}
+
+    return execute, calls
+
+
+async def test_concurrent_retries_run_once_and_share_the_response():
+    store = IdempotencyStore()
+    execute, calls = responder(delay=0.05)
+
+    results = await asyncio.gather(*(store.run("key", "body", execute) for _ in range(3)))
+
+    assert len(calls) == 1
+    assert [stored["body"] for stored, _ in results] == ["response 1"] * 3
+    assert sorted(replayed for _, replayed in results) == [False, True, True]
+
+
+async def test_later_retry_replays_the_stored_response():
+    store = IdempotencyStore()
+    execute, calls = responder()
+
+    await store.run("key", "body", execute)
+    stored, replayed = await store.run("key", "body", execute)
+
+    assert replayed and stored["body"] == "response 1"
+    assert len(calls) == 1
+
+
+async def test_same_key_with_a_different_body_conflicts():
+    store = IdempotencyStore()
+    execute, _ = responder()
+
+    await store.run("key", "body", execute)
+    with pytest.raises(IdempotencyConflict):
+        await store.run("key", "other body", execute)
+
+
+async def test_server_errors_are_not_stored():
+    store = IdempotencyStore()
+    execute, calls = responder(status=503)
+
+    await store.run("key", "body", execute)
+    _, replayed = await store.run("key", "body", execute)
+
+    assert not replayed
+    assert len(calls) == 2
@@ -0,0 +1,64 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from services.job_service import JobQueue
+
+pytestmark = pytest.mark.anyio
+
+
+class MemoryJobStore:
+    """In-memory JobStore whose first `failures` claims fail like a locked SQLite database."""
+
+    def __init__(self, failures: int = 0):
+        self.jobs = {}
+        self.failures = failures
+
+    def pending(self, stale_after):
+        return []
+
+    def create(self, job_id, generator, params, priority, user_id):
+        self.jobs[job_id] = {"id": job_id, "generator": generator, "params": params, "status": "queued"}
+
+    def get(self, job_id):
+        return dict(self.jobs[job_id]) if job_id in self.jobs else None
+
+    def claim(self, job_id):
+        if self.failures:
+            self.failures -= 1
+            raise sqlite3.OperationalError("database is locked")
+        self.jobs[job_id]["status"] = "running"
+        return True
+
+    def finish(self, job_id, status, result, error):
+        self.jobs[job_id].update(status="succeeded" if status == 200 else "failed", result=result, error=error)
+
+    def requeue(self, job_id):
+        self.jobs[job_id]["status"] = "queued"
+
+    def stats(self):
+        return {"jobs": {}}
+
+
+async def run(job):
+    return {"status": 200, "result": job["params"]["topic"]}
+
+
+async def test_store_error_does_not_kill_the_worker():
+    store = MemoryJobStore(failures=1)
+    queue = JobQueue(store, run, workers=1)
+    await queue.start()
+    try:
+        lost = await queue.submit("tweet", {"topic": "a"})
+        kept = await queue.submit("tweet", {"topic": "b"})
+        await asyncio.wait_for(queue._queue.join(), 1)
+    finally:
+        await queue.stop()
+
+    assert store.jobs[lost["id"]]["status"] == "queued"
+    assert store.jobs[kept["id"]]["status"] == "succeeded"
+    stats = await queue.stats()
+    assert stats["store_errors"] == 1
+    assert stats["completed"] == 1
+    assert stats["running"] == 0
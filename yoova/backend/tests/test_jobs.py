@@ -0,0 +1,29 @@
+import json
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def job_queue(app_module):
+    await app_module.job_queue.start()
+    yield app_module.job_queue
+    await app_module.job_queue.stop()
+
+
+def status_events(response):
+    lines = response.text.splitlines()
+    return [json.loads(lines[i + 1][len("data: "):]) for i, line in enumerate(lines) if line == "event: status"]
+
+
+async def test_job_events_match_the_job_response(client, job_queue):
+    job = (await client.post("/jobs", json={"generator": "tweet", "params": {"topic": "job events"}})).json()
+
+    events = await client.get(f"/jobs/{job['id']}/events")
+    polled = await client.get(f"/jobs/{job['id']}")
+
+    statuses = status_events(events)
+    assert statuses[-1] == polled.json()
+    assert all(set(event) == set(polled.json()) for event in statuses)
+    assert "user_id" not in statuses[0]
@@ -0,0 +1,39 @@
+from services.key_pool_service import KeyPool
+
+
+def test_acquire_prefers_the_key_with_most_headroom():
+    pool = KeyPool(["key-a", "key-b"], rpm=60, tpm=100_000)
+
+    first = pool.acquire(50_000)
+    second = pool.acquire(10)
+
+    assert first is not second
+
+
+def test_throttled_key_leaves_rotation_while_another_is_ready():
+    pool = KeyPool(["key-a", "key-b"], rpm=60, tpm=100_000, cooldown=60)
+    throttled = pool.keys[0]
+
+    assert pool.penalize(throttled, 429)
+    assert pool.available() == 1
+    assert all(pool.acquire(1) is pool.keys[1] for _ in range(3))
+
+
+def test_last_ready_key_is_never_benched():
+    pool = KeyPool(["only"], rpm=60, tpm=100_000, cooldown=60, forbidden_cooldown=600)
+    key = pool.keys[0]
+
+    assert not pool.penalize(key, 429)
+    assert not pool.penalize(key, 403)
+    assert pool.available() == 1
+    assert pool.acquire(1) is key
+    assert pool.stats()["keys"][key.name]["throttled"] == 1
+
+
+def test_one_key_always_stays_in_rotation():
+    pool = KeyPool(["key-a", "key-b", "key-c"], rpm=60, tpm=100_000)
+
+    benched = [pool.penalize(key, 429) for key in pool.keys]
+
+    assert benched == [True, True, False]
+    assert pool.available() == 1
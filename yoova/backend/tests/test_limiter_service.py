@@ -0,0 +1,63 @@
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from services.limiter_service import RateLimiter, estimate_tokens
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_429_pauses_callers_and_halves_the_rate():
+    limiter = RateLimiter(rpm=600, tpm=1_000_000)
+
+    limiter.on_throttled(0.2)
+    started = time.monotonic()
+    await limiter.aacquire(10)
+
+    assert time.monotonic() - started >= 0.15
+    assert limiter.stats()["rate_scale"] == 0.5
+    assert limiter.stats()["throttled"] == 1
+
+
+async def test_rate_recovers_with_successes():
+    limiter = RateLimiter(rpm=600, tpm=1_000_000, recovery_step=0.1)
+    limiter.on_throttled(0)
+    limiter.on_throttled(0)
+
+    for _ in range(10):
+        limiter.on_success(10, 10)
+
+    assert limiter.stats()["rate_scale"] == 1.0
+
+
+def test_rate_never_backs_off_below_the_floor():
+    limiter = RateLimiter(rpm=600, tpm=1_000_000, min_scale=0.1)
+
+    for _ in range(10):
+        limiter.on_throttled(0)
+
+    assert limiter.stats()["rate_scale"] == 0.1
+
+
+async def test_saturated_quota_sheds_with_retry_after():
+    limiter = RateLimiter(rpm=6, tpm=1_000_000, max_wait=5)
+    await limiter.aacquire(10)
+
+    with pytest.raises(HTTPException) as shed:
+        await limiter.aacquire(10)
+
+    assert shed.value.status_code == 503
+    assert int(shed.value.headers["Retry-After"]) >= 5
+    assert limiter.stats()["rejected"] == 1
+    assert limiter.stats()["waiting"] == 0
+
+
+def test_estimate_counts_system_instruction_and_output_budget():
+    payload = {
+        "systemInstruction": {"parts": [{"text": "x" * 400}]},
+        "contents": [{"parts": [{"text": "y" * 400}]}],
+        "generationConfig": {"maxOutputTokens": 100},
+    }
+
+    assert estimate_tokens(payload) == 300
@@ -0,0 +1,76 @@
+import asyncio
+import contextlib
+
+import pytest
+from pydantic import BaseModel
+
+from services.pipeline_service import Generation, GeneratorSpec, Pipeline, stream_within
+
+pytestmark = pytest.mark.anyio
+
+
+class TopicRequest(BaseModel):
+    topic: str
+    keywords: str = ""
+
+
+class TextResponse(BaseModel):
+    text: str
+
+
+SPEC = GeneratorSpec("text", "/text", TopicRequest, TextResponse, "text", "text", "Write about '{topic}'.",
+                     keywords_hint="Use: {keywords}.", stream=True)
+
+
+def test_spec_renders_prompt_and_response():
+    assert SPEC.render(TopicRequest(topic="cats", keywords="fur")) == "Write about 'cats'. Use: fur."
+    assert SPEC.missing(TopicRequest(topic="")) == "Topic is required."
+    assert SPEC.response("hello") == TextResponse(text="hello")
+    assert SPEC.paths == ["/text", "/text/stream"]
+    assert Generation(SPEC, TopicRequest(topic="cats"), stream=True).endpoint == "/text/stream"
+
+
+async def test_stages_run_outermost_first_and_may_answer_alone():
+    order = []
+
+    def stage(name, answer=None):
+        async def run(generation, call_next):
+            order.append(name)
+            if answer is not None:
+                return answer
+            return await call_next()
+        return run
+
+    async def terminal(generation):
+        order.append("terminal")
+        return "generated"
+
+    generation = Generation(SPEC, TopicRequest(topic="cats"))
+    assert await Pipeline([stage("outer"), stage("inner")], terminal).run(generation) == "generated"
+    assert await Pipeline([stage("cache", answer="cached"), stage("inner")], terminal).run(generation) == "cached"
+    assert order == ["outer", "inner", "terminal", "cache"]
+
+
+async def test_stream_within_closes_the_wrapped_stream_when_abandoned():
+    closed = asyncio.Event()
+    entered = []
+
+    async def chunks():
+        try:
+            for i in range(10):
+                yield f"chunk{i}"
+        finally:
+            closed.set()
+
+    @contextlib.asynccontextmanager
+    async def context():
+        entered.append("in")
+        yield
+        entered.append("out")
+
+    stream = stream_within(chunks(), context())
+    assert await stream.__anext__() == "chunk0"
+    await stream.aclose()
+
+    assert closed.is_set()
+    assert entered == ["in"]
@@ -0,0 +1,41 @@
+import pytest
+from fastapi import HTTPException
+
+from services.resilience_service import CircuitBreaker, Resilience, UpstreamUnavailable
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_transient_failures_are_retried():
+    resilience = Resilience(CircuitBreaker(), attempts=3, base_delay=0)
+    outcomes = [UpstreamUnavailable(503, "busy"), "ok"]
+
+    async def call():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert await resilience.acall(call) == "ok"
+    assert resilience.retries == 1
+
+
+async def test_breaker_opens_after_repeated_failures_and_fails_fast():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    resilience = Resilience(breaker, attempts=2, base_delay=0)
+    calls = []
+
+    async def fail():
+        calls.append(1)
+        raise UpstreamUnavailable(502, "down")
+
+    with pytest.raises(HTTPException) as failed:
+        await resilience.acall(fail)
+    assert failed.value.status_code == 502
+    with pytest.raises(HTTPException) as rejected:
+        await resilience.acall(fail)
+
+    assert rejected.value.status_code == 503
+    assert "Retry-After" in rejected.value.headers
+    assert len(calls) == 2
+    assert breaker.stats()["state"] == "open"
@@ -0,0 +1,39 @@
+from services.router_service import ModelRouter
+
+BACKENDS = {"gemini": "https://gemini.test/v1beta", "local": "http://localhost:9000/v1beta"}
+
+
+def router(**options):
+    return ModelRouter(BACKENDS, {"/script": ["gemini-1.5-flash", "local/llama"]}, ["gemini-1.5-flash"],
+                       targets={"/script": 1.0}, default_target=1.0, min_samples=3, **options)
+
+
+def test_models_map_to_their_backend_urls():
+    models = router()
+
+    assert models.url("gemini-1.5-flash") == "https://gemini.test/v1beta/models/gemini-1.5-flash:generateContent"
+    assert models.url("local/llama") == "http://localhost:9000/v1beta/models/llama:generateContent"
+
+
+def test_falls_back_while_the_preferred_model_fails():
+    models = router()
+    for _ in range(3):
+        models.record("/script", models.url("gemini-1.5-flash"), 0.1, ok=False)
+
+    assert models.choose("/script") == "local/llama"
+    assert models.choose("/other") == "gemini-1.5-flash"
+    assert models.fallbacks == 1
+
+
+def test_falls_back_while_the_preferred_model_is_slow():
+    models = router()
+    for _ in range(3):
+        models.record("/script", models.url("gemini-1.5-flash"), 5.0, ok=True)
+
+    assert models.choose("/script") == "local/llama"
+
+
+def test_skips_models_that_cannot_produce_the_output_length():
+    models = router(output_limits={"gemini-1.5-flash": 2048}, output_needs={"/script": 4096})
+
+    assert models.choose("/script") == "local/llama"
@@ -0,0 +1,23 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_cheap_endpoints_keep_the_default_model(client, gemini):
+    response = await client.post("/x/generate-tweet", json={"topic": "routing default"})
+
+    assert response.status_code == 200
+    assert "X-Degraded" not in response.headers
+    assert "/models/gemini-1.5-flash:" in gemini.calls[-1]["url"]
+
+
+async def test_stream_outcomes_feed_the_router(client, app_module):
+    def samples():
+        models = app_module.model_router.stats()["endpoints"].get("/youtube/generate-script/stream", {}).get("models", {})
+        return models.get("gemini-1.5-flash", {}).get("samples", 0)
+
+    before = samples()
+    response = await client.post("/youtube/generate-script/stream", json={"topic": "routing stream"})
+
+    assert response.status_code == 200
+    assert samples() == before + 1
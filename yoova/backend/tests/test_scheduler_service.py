@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from services.scheduler_service import PriorityScheduler, lowest_priority
+
+pytestmark = pytest.mark.anyio
+
+
+async def grant_order(scheduler, requests):
+    """Names of `requests` (priority, user, name) in the order one contended slot is granted to them."""
+    order = []
+    await scheduler.acquire("interactive", "holder")
+
+    async def run(priority, user, name):
+        async with scheduler.slot(priority, user):
+            order.append(name)
+
+    tasks = [asyncio.create_task(run(*request)) for request in requests]
+    await asyncio.sleep(0)
+    scheduler.release()
+    await asyncio.gather(*tasks)
+    return order
+
+
+def test_callers_may_only_lower_their_class():
+    assert lowest_priority("interactive", "bulk") == "bulk"
+    assert lowest_priority("bulk", "interactive") == "bulk"
+
+
+async def test_more_urgent_classes_go_first():
+    scheduler = PriorityScheduler(slots=1)
+
+    order = await grant_order(scheduler, [("bulk", "a", "bulk"), ("standard", "a", "standard"),
+                                          ("interactive", "a", "interactive")])
+
+    assert order == ["interactive", "standard", "bulk"]
+
+
+async def test_users_share_a_class_by_deficit_round_robin():
+    scheduler = PriorityScheduler(slots=1)
+    requests = [("interactive", "heavy", f"heavy{i}") for i in range(6)] + [("interactive", "light", f"light{i}") for i in range(2)]
+
+    order = await grant_order(scheduler, requests)
+
+    # The light user is not stuck behind the heavy user's backlog.
+    assert {name for name in order[:4] if name.startswith("light")} == {"light0", "light1"}
+    assert [name for name in order if name.startswith("heavy")] == [f"heavy{i}" for i in range(6)]
+
+
+async def test_weights_set_each_users_share():
+    scheduler = PriorityScheduler(slots=1, weights={"gold": 2})
+    requests = [("interactive", "gold", f"gold{i}") for i in range(6)] + [("interactive", "free", f"free{i}") for i in range(6)]
+
+    order = await grant_order(scheduler, requests)
+
+    assert sum(name.startswith("gold") for name in order[:6]) == 4
+
+
+async def test_starved_waiters_jump_the_line():
+    scheduler = PriorityScheduler(slots=1, starvation_after=0)
+
+    order = await grant_order(scheduler, [("bulk", "a", "bulk"), ("interactive", "b", "interactive")])
+
+    assert order == ["bulk", "interactive"]
+    assert scheduler.promoted == 1
+
+
+async def test_cancelled_waiter_gives_up_its_place():
+    scheduler = PriorityScheduler(slots=1)
+    await scheduler.acquire("interactive", "holder")
+    waiter = asyncio.create_task(scheduler.acquire("interactive", "a"))
+    await asyncio.sleep(0)
+
+    waiter.cancel()
+    await asyncio.gather(waiter, return_exceptions=True)
+    scheduler.release()
+
+    assert scheduler.in_use == 0
+    assert scheduler.waiting_ahead("bulk") == 0
@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+def texts(response):
+    events = [json.loads(line[len("data: "):]) for line in response.text.splitlines() if line.startswith("data: ")]
+    return [event["text"] for event in events if "text" in event]
+
+
+async def test_finished_stream_is_cached_for_its_generator(client, gemini):
+    body = {"topic": "streamed then cached"}
+    streamed = await client.post("/youtube/generate-script/stream", json=body)
+    calls = len(gemini.calls)
+    plain = await client.post("/youtube/generate-script", json=body)
+    replayed = await client.post("/youtube/generate-script/stream", json=body)
+
+    assert texts(streamed) == ["chunk0 ", "chunk1 ", "chunk2 "]
+    assert plain.json() == {"script": "chunk0 chunk1 chunk2 "}
+    assert texts(replayed) == ["chunk0 chunk1 chunk2 "]
+    assert len(gemini.calls) == calls
+
+
+async def test_stream_must_start_within_the_deadline(client, gemini):
+    gemini.delay = 0.5
+
+    response = await client.post("/youtube/generate-script/stream", json={"topic": "slow stream"},
+                                 headers={"X-Request-Timeout": "0.2"})
+
+    assert response.status_code == 504
+
+
+async def test_slow_stream_that_started_in_time_runs_past_the_deadline(client, gemini, app_module):
+    gemini.chunk_delay = 0.15
+
+    response = await client.post("/youtube/generate-script/stream", json={"topic": "slow chunks"},
+                                 headers={"X-Request-Timeout": "0.3"})
+
+    assert response.status_code == 200
+    assert texts(response) == ["chunk0 ", "chunk1 ", "chunk2 "]
+    timeout = gemini.calls[-1]["timeout"]
+    assert timeout["connect"] <= 0.3
+    assert timeout["read"] == app_module.GEMINI_TIMEOUT
+
+
+async def test_stream_holds_its_slot_and_records_its_outcome(client, app_module):
+    samples = app_module.degradation.stats()["recent_samples"]
+
+    response = await client.post("/youtube/generate-script/stream", json={"topic": "recorded stream"})
+
+    assert response.status_code == 200
+    assert app_module.scheduler.stats()["in_use"] == 0
+    assert app_module.degradation.stats()["recent_samples"] == samples + 1
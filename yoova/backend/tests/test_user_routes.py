@@ -0,0 +1,26 @@
+from starlette.requests import Request
+
+from routes import user_routes
+
+
+def request_with(headers: dict, host: str = "10.0.0.1") -> Request:
+    raw = [(name.lower().encode(), value.encode()) for name, value in headers.items()]
+    return Request({"type": "http", "headers": raw, "client": (host, 1234)})
+
+
+def test_recognized_key_identifies_the_user(monkeypatch):
+    monkeypatch.setattr(user_routes, "KNOWN_KEY_IDS", {user_routes.key_id("secret")})
+
+    user = user_routes.user_id_for(request_with({"X-API-Key": "secret"}))
+
+    assert user == user_routes.key_id("secret")
+    assert "secret" not in user
+
+
+def test_unrecognized_keys_fall_back_to_the_client_address(monkeypatch):
+    monkeypatch.setattr(user_routes, "KNOWN_KEY_IDS", {user_routes.key_id("secret")})
+
+    users = {user_routes.user_id_for(request_with({"X-API-Key": f"made-up-{i}"})) for i in range(5)}
+
+    assert users == {user_routes.address_id("10.0.0.1")}
+    assert "10.0.0.1" not in users.pop()
@@ -0,0 +1,76 @@
+import hashlib
+import json
+import math
+import time
+from contextvars import ContextVar
+from typing import Any, Optional, Set
+
+from fastapi import HTTPException
+
+
+class Deadline:
+    """Absolute end-to-end latency budget for one request."""
+
+    def __init__(self, budget: float):
+        self.budget = budget
+        self.expires_at = time.monotonic() + budget
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    def timeout(self, ceiling: float) -> float:
+        """Upstream timeout for the next attempt: what is left of the budget, at most `ceiling`."""
+        return max(0.001, min(ceiling, self.remaining()))
+
+    def exceeded(self, reason: str) -> HTTPException:
+        return HTTPException(status_code=504, detail=f"Deadline of {self.budget:g}s exceeded: {reason}.")
+
+    def widen(self, other: Optional["Deadline"]) -> None:
+        """Moves the expiry out to `other`'s if that is later; `None` lifts it altogether."""
+        if other is None:
+            self.expires_at = math.inf
+        elif other.expires_at > self.expires_at:
+            self.budget, self.expires_at = other.budget, other.expires_at
+
+    def check(self, reason: str, needed: float = 0.0) -> None:
+        """Raises a 504 unless more than `needed` seconds of the budget are left."""
+        if self.remaining() <= needed:
+            raise self.exceeded(reason)
+
+
+# Endpoint the current generation was requested through; set by the endpoint layer so the
+# upstream client can keep per-endpoint statistics.
+current_endpoint: ContextVar[Optional[str]] = ContextVar("current_endpoint", default=None)
+# Deadline of the current request, if it has one; every wait and upstream attempt honors it.
+current_deadline: ContextVar[Optional[Deadline]] = ContextVar("current_deadline", default=None)
+# Priority class the current request asked for (or was capped to); see services.scheduler_service.
+current_priority: ContextVar[Optional[str]] = ContextVar("current_priority", default=None)
+# API user the current request is made on behalf of; see routes.user_routes.
+current_user: ContextVar[Optional[str]] = ContextVar("current_user", default=None)
+# Id of the background job being run, if the current generation is one.
+current_job: ContextVar[Optional[str]] = ContextVar("current_job", default=None)
+# Changes to the upstream request ("model", "max_output_tokens") while service is degraded.
+current_overrides: ContextVar[Optional[dict]] = ContextVar("current_overrides", default=None)
+# Ways the current response was degraded; the endpoint layer reports them to the client.
+current_degradations: ContextVar[Optional[Set[str]]] = ContextVar("current_degradations", default=None)
+
+
+def normalize_text(value: Any) -> Any:
+    """Collapses whitespace and case so trivially different inputs share a key."""
+    if isinstance(value, str):
+        return " ".join(value.split()).casefold()
+    return value
+
+
+def stable_key(namespace: str, params: dict) -> str:
+    """Returns a deterministic hash for a namespace plus its normalized parameters."""
+    normalized = {name: normalize_text(value) for name, value in sorted(params.items())}
+    raw = json.dumps([namespace, normalized], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def size_of(value: Any) -> int:
+    """Approximate in-memory footprint of a cached value, in bytes."""
+    if isinstance(value, str):
+        return len(value.encode())
+    return len(json.dumps(value).encode())
@@ -22,25 +22,65 @@ document.addEventListener('DOMContentLoaded', () => {
 
     const API_BASE_URL = "http://127.0.0.1:8000"; // Base URL for your backend API
 
+    // One request in flight per button: clicking again aborts the previous request, which
+    // also lets the server stop its upstream generation.
+    const inFlight = {};
+    function restart(buttonId) {
+        if (inFlight[buttonId]) inFlight[buttonId].abort();
+        inFlight[buttonId] = new AbortController();
+        return inFlight[buttonId].signal;
+    }
+
+    // Reads a server-sent event stream from a POST endpoint and appends each chunk to the output.
+    async function streamInto(path, body, outputId, errorMessage, signal) {
+        const output = document.getElementById(outputId);
+        output.innerText = '';
+        try {
+            const response = await fetch(`${API_BASE_URL}${path}`, {
+                method: 'POST',
+                signal: signal,
+                headers: {
+                    'Content-Type': 'application/json',
+                    'Accept': 'text/event-stream',
+                },
+                body: JSON.stringify(body),
+            });
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
+            }
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                const events = buffer.split('\n\n');
+                buffer = events.pop();
+                for (const raw of events) {
+                    let event = 'message';
+                    let data = '';
+                    for (const line of raw.split('\n')) {
+                        if (line.startsWith('event:')) event = line.slice(6).trim();
+                        else if (line.startsWith('data:')) data += line.slice(5).trim();
+                    }
+                    if (event === 'error') throw new Error(JSON.parse(data).detail);
+                    if (event === 'message' && data) output.innerText += JSON.parse(data).text;
+                }
+            }
+        } catch (error) {
+            if (error.name === 'AbortError') return;
+            console.error('Error:', error);
+            output.innerText = errorMessage;
+        }
+    }
+
     // --- YouTube Functions ---
     document.getElementById('generateScript').addEventListener('click', () => {
         const topic = document.getElementById('youtubeTopic').value;
         const style = document.getElementById('youtubeStyle').value;
-        fetch(`${API_BASE_URL}/youtube/generate-script`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({ topic: topic, style: style || "informative" }),
-        })
-            .then(response => response.json())
-            .then(data => {
-                document.getElementById('youtubeOutput').innerText = data.script;
-            })
-            .catch(error => {
-                console.error('Error:', error);
-                document.getElementById('youtubeOutput').innerText = 'Error generating script.';
-            });
+        streamInto('/youtube/generate-script/stream', { topic: topic, style: style || "informative" },
+            'youtubeOutput', 'Error generating script.', restart('generateScript'));
     });
 
     document.getElementById('suggestChannelName').addEventListener('click', () => {
@@ -49,6 +89,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
         fetch(`${API_BASE_URL}/youtube/suggest-channel-name`, {
             method: 'POST',
+            signal: restart('suggestChannelName'),
             headers: {
                 'Content-Type': 'application/json',
             },
@@ -59,6 +100,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 document.getElementById('youtubeOutput').innerText = data.channel_name;
             })
             .catch(error => {
+                if (error.name === 'AbortError') return;
                 console.error('Error:', error);
                 document.getElementById('youtubeOutput').innerText = 'Error suggesting channel name.';
             });
@@ -68,6 +110,7 @@ document.addEventListener('DOMContentLoaded', () => {
         const interests = document.getElementById('youtubeTopic').value;
         fetch(`${API_BASE_URL}/youtube/suggest-niche`, {
             method: 'POST',
+            signal: restart('suggestNiche'),
             headers: {
                 'Content-Type': 'application/json',
             },
@@ -78,6 +121,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 document.getElementById('youtubeOutput').innerText = data.niche_suggestions;
             })
             .catch(error => {
+                if (error.name === 'AbortError') return;
                 console.error('Error:', error);
                 document.getElementById('youtubeOutput').innerText = 'Error suggesting a niche.';
             });
@@ -89,6 +133,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
         fetch(`${API_BASE_URL}/youtube/generate-video-ideas`, {
             method: 'POST',
+            signal: restart('generateVideoIdeas'),
             headers: {
                 'Content-Type': 'application/json',
             },
@@ -99,6 +144,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 document.getElementById('youtubeOutput').innerText = data.video_ideas;
             })
             .catch(error => {
+                if (error.name === 'AbortError') return;
                 console.error('Error:', error);
                 document.getElementById('youtubeOutput').innerText = 'Error generating video ideas.';
             });
@@ -111,6 +157,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
         fetch(`${API_BASE_URL}/youtube/generate-post-content`, {
             method: 'POST',
+            signal: restart('generatePostContent'),
             headers: {
                 'Content-Type': 'application/json',
             },
@@ -121,6 +168,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 document.getElementById('youtubeOutput').innerText = data.post_content;
             })
             .catch(error => {
+                if (error.name === 'AbortError') return;
                 console.error('Error:', error);
                 document.getElementById('youtubeOutput').innerText = 'Error generating post content.';
             });
@@ -134,6 +182,7 @@ document.addEventListener('DOMContentLoaded', () => {
         const style = document.getElementById('xStyle').value;
         fetch(`${API_BASE_URL}/x/generate-tweet`, {
             method: 'POST',
+            signal: restart('generateTweet'),
             headers: {
                 'Content-Type': 'application/json',
             },
@@ -144,6 +193,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 document.getElementById('xOutput').innerText = data.tweet;
             })
             .catch(error => {
+                if (error.name === 'AbortError') return;
                 console.error('Error:', error);
                 document.getElementById('xOutput').innerText = 'Error generating tweet.';
             });
@@ -157,6 +207,7 @@ document.addEventListener('DOMContentLoaded', () => {
         const style = document.getElementById('instagramStyle').value;
         fetch(`${API_BASE_URL}/instagram/generate-post`, {
             method: 'POST',
+            signal: restart('generateInstagramPost'),
             headers: {
                 'Content-Type': 'application/json',
             },
@@ -167,6 +218,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 document.getElementById('instagramOutput').innerText = data.post_content;
             })
             .catch(error => {
+                if (error.name === 'AbortError') return;
                 console.error('Error:', error);
                 document.getElementById('instagramOutput').innerText = 'Error generating Instagram post content.';
             });
@@ -178,6 +230,7 @@ document.addEventListener('DOMContentLoaded', () => {
         const style = document.getElementById('instagramStyle').value;
         fetch(`${API_BASE_URL}/instagram/generate-story`, {
             method: 'POST',
+            signal: restart('generateInstagramStory'),
             headers: {
                 'Content-Type': 'application/json',
             },
@@ -188,6 +241,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 document.getElementById('instagramOutput').innerText = data.story_content;
             })
             .catch(error => {
+                if (error.name === 'AbortError') return;
                 console.error('Error:', error);
                 document.getElementById('instagramOutput').innerText = 'Error generating Instagram story content.';
             });
@@ -199,6 +253,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
         fetch(`${API_BASE_URL}/instagram/suggest-channel-name`, {
             method: 'POST',
+            signal: restart('suggestInstagramChannelName'),
             headers: {
                 'Content-Type': 'application/json',
             },
@@ -209,6 +264,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 document.getElementById('instagramOutput').innerText = data.channel_name;
             })
             .catch(error => {
+                if (error.name === 'AbortError') return;
                 console.error('Error:', error);
                 document.getElementById('instagramOutput').innerText = 'Error suggesting Instagram channel name.';
             });
@@ -220,6 +276,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
         fetch(`${API_BASE_URL}/instagram/generate-video-ideas`, {
             method: 'POST',
+            signal: restart('generateInstagramVideoIdeas'),
             headers: {
                 'Content-Type': 'application/json',
             },
@@ -230,6 +287,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 document.getElementById('instagramOutput').innerText = data.video_ideas;
             })
             .catch(error => {
+                if (error.name === 'AbortError') return;
                 console.error('Error:', error);
                 document.getElementById('instagramOutput').innerText = 'Error generating Instagram video ideas.';
             });
@@ -239,6 +297,7 @@ document.addEventListener('DOMContentLoaded', () => {
         const interests = document.getElementById('instagramTopic').value;
         fetch(`${API_BASE_URL}/instagram/suggest-niche`, {
             method: 'POST',
+            signal: restart('suggestInstagramNiche'),
             headers: {
                 'Content-Type': 'application/json',
             },
@@ -249,6 +308,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 document.getElementById('instagramOutput').innerText = data.niche_suggestions;
             })
             .catch(error => {
+                if (error.name === 'AbortError') return;
                 console.error('Error:', error);
                 document.getElementById('instagramOutput').innerText = 'Error suggesting Instagram niche.';
             });
@@ -259,6 +319,7 @@ document.addEventListener('DOMContentLoaded', () => {
         const keywords = document.getElementById('instagramKeywords').value;
         fetch(`${API_BASE_URL}/instagram/generate-reel-ideas`, {
             method: 'POST',
+            signal: restart('generateInstagramReelIdeas'),
             headers: {
                 'Content-Type': 'application/json',
             },
@@ -269,6 +330,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 document.getElementById('instagramOutput').innerText = data.reel_ideas;
             })
             .catch(error => {
+                if (error.name === 'AbortError') return;
                 console.error('Error:', error);
                 document.getElementById('instagramOutput').innerText = 'Error generating Instagram reel ideas.';
             });
@@ -277,21 +339,8 @@ document.addEventListener('DOMContentLoaded', () => {
     document.getElementById('generateInstagramVideoScript').addEventListener('click', () => {
         const topic = document.getElementById('instagramTopic').value;
         const style = document.getElementById('instagramStyle').value;
-        fetch(`${API_BASE_URL}/instagram/generate-video-script`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({ topic: topic, style: style || "informative" }),
-        })
-            .then(response => response.json())
-            .then(data => {
-                document.getElementById('instagramOutput').innerText = data.script;
-            })
-            .catch(error => {
-                console.error('Error:', error);
-                document.getElementById('instagramOutput').innerText = 'Error generating Instagram video script.';
-            });
+        streamInto('/instagram/generate-video-script/stream', { topic: topic, style: style || "informative" },
+            'instagramOutput', 'Error generating Instagram video script.', restart('generateInstagramVideoScript'));
     });
 
 
@@ -302,6 +351,7 @@ document.addEventListener('DOMContentLoaded', () => {
         const keywords = document.getElementById('emailKeywords').value;
         fetch(`${API_BASE_URL}/email/generate-email`, {
             method: 'POST',
+            signal: restart('generateEmail'),
             headers: {
                 'Content-Type': 'application/json',
             },
@@ -312,6 +362,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 document.getElementById('emailOutput').innerText = data.email_content;
             })
             .catch(error => {
+                if (error.name === 'AbortError') return;
                 console.error('Error:', error);
                 document.getElementById('emailOutput').innerText = 'Error generating email.';
             });